@@ -121,6 +121,6 @@ class AsianLimitedEditionDress(LimitedEditionDress):
     def getType(self):
         return "Asian Really Limited Expensive Edition Dress"
 
-website = Website()
-website.getPackage("asia")
-        
+if __name__ == "__main__":
+    website = Website()
+    website.getPackage("asia")
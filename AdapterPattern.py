@@ -33,12 +33,6 @@ class Alipay:
     def shouFei(self, amount):
         self.payment.chargeAccount("AliPay", amount)
 
-paypalPayment = Paypal(Payment())
-paypalPayment.sendCash(5000)
-
-alipayPayment = Alipay(Payment())
-alipayPayment.shouFei(5000)
-
 """
    Class Adapter - uses class inheritance to achieve adaptation
 """
@@ -55,5 +49,12 @@ class Alipay2(Payment2):
     def shouFei(self, amount):
         self.chargeAccount("AliPay", amount)
 
-paypal2Payment = Paypal2()
-paypal2Payment.sendCash(5000)
+if __name__ == "__main__":
+    paypalPayment = Paypal(Payment())
+    paypalPayment.sendCash(5000)
+
+    alipayPayment = Alipay(Payment())
+    alipayPayment.shouFei(5000)
+
+    paypal2Payment = Paypal2()
+    paypal2Payment.sendCash(5000)
@@ -85,16 +85,17 @@ class Audio(OutputDevice):
 	def zoom(self):
 		print 'Sound: Vrooom'
 
-screen = Screen()
-audio = Audio()
+if __name__ == "__main__":
+	screen = Screen()
+	audio = Audio()
 
-hand = Gestures(screen)
-mouse = Mouse(audio)
+	hand = Gestures(screen)
+	mouse = Mouse(audio)
 
-hand.tap()
-hand.swipe()
-hand.pinch()
+	hand.tap()
+	hand.swipe()
+	hand.pinch()
 
-mouse.click()
-mouse.move()
-mouse.wheel()
+	mouse.click()
+	mouse.move()
+	mouse.wheel()
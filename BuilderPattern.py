@@ -89,18 +89,19 @@ class Barista:
 		self.maker.putWater()
 		self.maker.putChocolate()
 
-americanoMaker = AmericanoMaker()
-latteMaker = LatteMaker()
-mochaMaker = MochaMaker()
-
-john = Barista(americanoMaker)
-john.makeCoffee()
-print john.serveCoffee()
-
-john.setMaker(latteMaker)
-john.makeCoffee()
-print john.serveCoffee()
-
-john.setMaker(mochaMaker)
-john.makeCoffee()
-print john.serveCoffee()
\ No newline at end of file
+if __name__ == "__main__":
+	americanoMaker = AmericanoMaker()
+	latteMaker = LatteMaker()
+	mochaMaker = MochaMaker()
+
+	john = Barista(americanoMaker)
+	john.makeCoffee()
+	print john.serveCoffee()
+
+	john.setMaker(latteMaker)
+	john.makeCoffee()
+	print john.serveCoffee()
+
+	john.setMaker(mochaMaker)
+	john.makeCoffee()
+	print john.serveCoffee()
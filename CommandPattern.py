@@ -9,32 +9,221 @@
    text editor and the text editor will handle it for him/her.
 """
 
+import bisect
 from abc import ABCMeta, abstractmethod
+from collections import deque
 
-class TextEditor:
-    def __init__(self, value):
-        self.value = value
+class StringBuffer(object):
+    """
+       Keeps the whole document in a single string. Every edit rebuilds the
+       string, so it is only suitable for small documents.
+    """
+    def __init__(self, text=""):
+        self.text = text
+
+    def length(self):
+        return len(self.text)
+
+    def slice(self, start, end):
+        return self.text[start:end]
+
+    def insert(self, offset, text):
+        self.text = self.text[:offset] + text + self.text[offset:]
+
+    def delete(self, start, end):
+        self.text = self.text[:start] + self.text[end:]
+
+    def getValue(self):
+        return self.text
+
+class PieceTableBuffer(object):
+    """
+       Piece table - the document is described by a list of pieces, each one
+       pointing to a span of an immutable source string (the original text or
+       a piece of pasted text). Pieces are kept in blocks of at most
+       2 * blockSize pieces. starts holds the document offset of every block
+       and ends the offset where each piece of a block ends, relative to the
+       block, so finding the piece at an offset is two bisections. Edits
+       split and insert pieces within a block and shift the following ends
+       and starts, they never copy the document. Offsets are clamped to the
+       document like string slices are.
+    """
+    blockSize = 64
+
+    def __init__(self, text=""):
+        self.blocks = [[(text, 0, len(text))]] if text else []
+        self.ends = [[len(text)]] if text else []
+        self.starts = [0] if text else []
+        self.size = len(text)
+
+    def length(self):
+        return self.size
+
+    def iterPieces(self):
+        for block in self.blocks:
+            for piece in block:
+                yield piece
+
+    def clamp(self, offset):
+        return min(max(offset, 0), self.size)
+
+    def find(self, offset):
+        # Returns (block index, piece index, piece offset) of the piece holding offset
+        blockIndex = bisect.bisect_right(self.starts, offset) - 1
+        ends = self.ends[blockIndex]
+        pieceIndex = bisect.bisect_right(ends, offset - self.starts[blockIndex])
+        position = self.starts[blockIndex] + (ends[pieceIndex - 1] if pieceIndex else 0)
+        return blockIndex, pieceIndex, position
+
+    def split(self, offset):
+        # Returns (block index, piece index) of the piece starting at offset, splitting a piece if needed
+        if offset >= self.size:
+            return len(self.blocks), 0
+        blockIndex, pieceIndex, position = self.find(offset)
+        if offset == position:
+            return blockIndex, pieceIndex
+        source, start, length = self.blocks[blockIndex][pieceIndex]
+        cut = offset - position
+        self.blocks[blockIndex][pieceIndex:pieceIndex + 1] = [(source, start, cut), (source, start + cut, length - cut)]
+        self.ends[blockIndex].insert(pieceIndex, offset - self.starts[blockIndex])
+        return blockIndex, pieceIndex + 1
+
+    def shift(self, offsets, index, delta):
+        # Moves the offsets from index on by delta, the loop runs in C
+        offsets[index:] = map(delta.__add__, offsets[index:])
+
+    def splitBlock(self, blockIndex):
+        block = self.blocks[blockIndex]
+        if len(block) <= 2 * self.blockSize:
+            return
+        ends = self.ends[blockIndex]
+        cut = ends[self.blockSize - 1]
+        self.blocks.insert(blockIndex + 1, block[self.blockSize:])
+        self.ends.insert(blockIndex + 1, map((-cut).__add__, ends[self.blockSize:]))
+        self.starts.insert(blockIndex + 1, self.starts[blockIndex] + cut)
+        del block[self.blockSize:]
+        del ends[self.blockSize:]
+
+    def removeBlock(self, blockIndex):
+        del self.blocks[blockIndex]
+        del self.ends[blockIndex]
+        del self.starts[blockIndex]
+
+    def slice(self, start, end):
+        start = self.clamp(start)
+        end = self.clamp(end)
+        if start >= end:
+            return ""
+        parts = []
+        blockIndex, pieceIndex, position = self.find(start)
+        while position < end:
+            for source, pieceStart, length in self.blocks[blockIndex][pieceIndex:]:
+                if position >= end:
+                    break
+                lower = max(start - position, 0)
+                upper = min(end - position, length)
+                parts.append(source[pieceStart + lower:pieceStart + upper])
+                position += length
+            blockIndex += 1
+            pieceIndex = 0
+        return "".join(parts)
+
+    def insert(self, offset, text):
+        if not text:
+            return
+        offset = self.clamp(offset)
+        blockIndex, pieceIndex = self.split(offset)
+        if blockIndex == len(self.blocks):
+            if not self.blocks:
+                self.blocks.append([])
+                self.ends.append([])
+                self.starts.append(0)
+            blockIndex = len(self.blocks) - 1
+            pieceIndex = len(self.blocks[blockIndex])
+        ends = self.ends[blockIndex]
+        self.blocks[blockIndex].insert(pieceIndex, (text, 0, len(text)))
+        ends.insert(pieceIndex, offset - self.starts[blockIndex])
+        self.shift(ends, pieceIndex, len(text))
+        self.shift(self.starts, blockIndex + 1, len(text))
+        self.size += len(text)
+        self.splitBlock(blockIndex)
+
+    def delete(self, start, end):
+        start = self.clamp(start)
+        end = self.clamp(end)
+        if start >= end:
+            return
+        firstBlock, firstPiece = self.split(start)
+        lastBlock, lastPiece = self.split(end)
+        if firstBlock == lastBlock:
+            del self.blocks[firstBlock][firstPiece:lastPiece]
+            del self.ends[firstBlock][firstPiece:lastPiece]
+            self.shift(self.ends[firstBlock], firstPiece, start - end)
+        else:
+            # The pieces of the last block left after end now start at start
+            del self.blocks[firstBlock][firstPiece:]
+            del self.ends[firstBlock][firstPiece:]
+            if lastBlock < len(self.blocks):
+                del self.blocks[lastBlock][:lastPiece]
+                del self.ends[lastBlock][:lastPiece]
+                self.shift(self.ends[lastBlock], 0, self.starts[lastBlock] - end)
+                self.starts[lastBlock] = end
+            del self.blocks[firstBlock + 1:lastBlock]
+            del self.ends[firstBlock + 1:lastBlock]
+            del self.starts[firstBlock + 1:lastBlock]
+        self.shift(self.starts, firstBlock + 1, start - end)
+        self.size -= end - start
+        for blockIndex in (firstBlock + 1, firstBlock):
+            if blockIndex < len(self.blocks) and not self.blocks[blockIndex]:
+                self.removeBlock(blockIndex)
+
+    def getValue(self):
+        return "".join(source[start:start + length] for source, start, length in self.iterPieces())
+
+class TextEditor(object):
+    def __init__(self, value, bufferType=PieceTableBuffer):
+        self.bufferType = bufferType
+        self.buffer = bufferType(value)
+        self.cachedValue = value
         self.selection = [0, 0]
         self.clipboard = ""
 
+    def getValue(self):
+        # The full document is only built when somebody reads it
+        if self.cachedValue is None:
+            self.cachedValue = self.buffer.getValue()
+        return self.cachedValue
+
+    def setValue(self, value):
+        self.buffer = self.bufferType(value)
+        self.cachedValue = value
+
+    value = property(getValue, setValue)
+
     def copy(self):
-        self.clipboard = self.value[self.selection[0]:self.selection[1]]
+        self.clipboard = self.buffer.slice(self.selection[0], self.selection[1])
         self.selection = [0, 0]
 
     def cut(self):
-        valueBefore, valueAfter = self.valueOutsideSelection()
-        self.value = valueBefore + valueAfter
+        self.buffer.delete(self.selection[0], self.selection[1])
+        self.cachedValue = None
         self.selection = [0, 0]
 
     def paste(self):
-        valueBefore, valueAfter = self.valueOutsideSelection()
-        self.value = valueBefore + self.clipboard + valueAfter
+        self.buffer.delete(self.selection[0], self.selection[1])
+        self.buffer.insert(self.selection[0], self.clipboard)
+        self.cachedValue = None
         self.clipboard = ""
         self.selection = [0, 0]
 
+    def replace(self, start, end, text):
+        self.buffer.delete(start, end)
+        self.buffer.insert(start, text)
+        self.cachedValue = None
+
     def valueOutsideSelection(self):
-        valueAfter = self.value[self.selection[1]:]
-        valueBefore = self.value[0:self.selection[0]]
+        valueAfter = self.buffer.slice(self.selection[1], self.buffer.length())
+        valueBefore = self.buffer.slice(0, self.selection[0])
         return valueBefore, valueAfter
 
     def currentSettings(self):
@@ -49,6 +238,32 @@ class TextEditor:
         self.clipboard = settings["clipboard"]
         self.selection = settings["selection"]
 
+class EditDelta(object):
+    """
+       The change made by one command: the text removed and inserted at offset,
+       plus the clipboard before and after. It is enough to undo or redo the
+       command without keeping a copy of the document.
+    """
+    def __init__(self, offset, removed, inserted, clipboardBefore, clipboardAfter):
+        self.offset = offset
+        self.removed = removed
+        self.inserted = inserted
+        self.clipboardBefore = clipboardBefore
+        self.clipboardAfter = clipboardAfter
+
+    def apply(self, textEditor):
+        if self.removed or self.inserted:
+            textEditor.replace(self.offset, self.offset + len(self.removed), self.inserted)
+        textEditor.clipboard = self.clipboardAfter
+
+    def revert(self, textEditor):
+        if self.removed or self.inserted:
+            textEditor.replace(self.offset, self.offset + len(self.inserted), self.removed)
+        textEditor.clipboard = self.clipboardBefore
+
+    def size(self):
+        return len(self.removed) + len(self.inserted) + len(self.clipboardBefore) + len(self.clipboardAfter)
+
 class Command:
     __metaclass__ = ABCMeta
 
@@ -60,56 +275,242 @@ class Command:
     def undo(self):
         pass
 
-class CutCommand(Command):
+class TextCommand(Command):
     def __init__(self, textEditor, selection):
         self.textEditor = textEditor
         self.textEditor.selection = selection
-        self.previousSettings = self.textEditor.currentSettings()
+        self.selection = list(selection)
+        self.delta = None
 
-    def execute(self):
-        self.textEditor.cut()
+    def recordDelta(self, inserted, clipboardAfter):
+        start, end = self.selection
+        self.delta = EditDelta(start, self.textEditor.buffer.slice(start, end), inserted,
+                               self.textEditor.clipboard, clipboardAfter)
 
     def undo(self):
-        self.textEditor.loadSettings(self.previousSettings)
+        if self.delta:
+            self.delta.revert(self.textEditor)
+            self.textEditor.selection = list(self.selection)
 
-class CopyCommand(Command):
-    def __init__(self, textEditor, selection):
-        self.textEditor = textEditor
-        self.textEditor.selection = selection
-        self.previousSettings = self.textEditor.currentSettings()
+    def redo(self):
+        if self.delta:
+            self.delta.apply(self.textEditor)
+            self.textEditor.selection = [0, 0]
 
+class CutCommand(TextCommand):
     def execute(self):
+        self.recordDelta("", self.textEditor.clipboard)
+        self.textEditor.selection = list(self.selection)
+        self.textEditor.cut()
+
+    def replay(self, buffer, clipboard):
+        buffer.delete(self.selection[0], self.selection[1])
+        return clipboard
+
+class CopyCommand(TextCommand):
+    def execute(self):
+        start, end = self.selection
+        self.delta = EditDelta(start, "", "", self.textEditor.clipboard,
+                               self.textEditor.buffer.slice(start, end))
+        self.textEditor.selection = list(self.selection)
         self.textEditor.copy()
 
-    def undo(self):
-        self.textEditor.loadSettings(self.previousSettings)
+    def replay(self, buffer, clipboard):
+        return buffer.slice(self.selection[0], self.selection[1])
 
-class PasteCommand(Command):
-    def __init__(self, textEditor, selection):
+class PasteCommand(TextCommand):
+    def execute(self):
+        self.recordDelta(self.textEditor.clipboard, "")
+        self.textEditor.selection = list(self.selection)
+        self.textEditor.paste()
+
+    def replay(self, buffer, clipboard):
+        buffer.delete(self.selection[0], self.selection[1])
+        buffer.insert(self.selection[0], clipboard)
+        return ""
+
+class BufferView(object):
+    """
+       Lets a buffer be used as the source of a piece, so that a piece table
+       can describe edits on top of another buffer without copying it.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __len__(self):
+        return self.buffer.length()
+
+    def __getitem__(self, index):
+        return self.buffer.slice(index.start, index.stop)
+
+def applyEdits(textEditor, edits):
+    # edits are sorted, non overlapping (offset, length, text) replacements
+    buffer = textEditor.buffer
+    parts = []
+    position = 0
+    for offset, length, text in edits:
+        parts.append(buffer.slice(position, offset))
+        parts.append(text)
+        position = offset + length
+    parts.append(buffer.slice(position, buffer.length()))
+    textEditor.value = "".join(parts)
+
+class BatchDelta(object):
+    def __init__(self, edits, inverseEdits, clipboardBefore, clipboardAfter):
+        self.edits = edits
+        self.inverseEdits = inverseEdits
+        self.clipboardBefore = clipboardBefore
+        self.clipboardAfter = clipboardAfter
+
+    def apply(self, textEditor):
+        if self.edits:
+            applyEdits(textEditor, self.edits)
+        textEditor.clipboard = self.clipboardAfter
+
+    def revert(self, textEditor):
+        if self.inverseEdits:
+            applyEdits(textEditor, self.inverseEdits)
+        textEditor.clipboard = self.clipboardBefore
+
+    def size(self):
+        return (sum(len(text) for offset, length, text in self.edits) +
+                sum(len(text) for offset, length, text in self.inverseEdits) +
+                len(self.clipboardBefore) + len(self.clipboardAfter))
+
+class CommandBatch(Command):
+    """
+       Macro command - replays a sequence of cut, copy and paste commands on a
+       piece table laid over the document, merges the result into a list of
+       non overlapping edits and applies them in a single pass. The whole
+       batch is undone at once.
+    """
+    def __init__(self, textEditor, commands):
         self.textEditor = textEditor
-        self.textEditor.selection = selection
-        self.previousSettings = self.textEditor.currentSettings
+        self.commands = list(commands)
+        self.delta = None
+
+    def compile(self):
+        view = BufferView(self.textEditor.buffer)
+        length = len(view)
+        scratch = PieceTableBuffer(view)
+        clipboard = self.textEditor.clipboard
+        for command in self.commands:
+            clipboard = command.replay(scratch, clipboard)
+
+        edits = []
+        inverseEdits = []
+        pending = []
+        position = 0
+        shift = 0
+        def addEdit(end):
+            text = "".join(pending)
+            edits.append((position, end - position, text))
+            inverseEdits.append((position + shift, len(text), view[position:end]))
+            del pending[:]
+            return shift + len(text) - (end - position)
+
+        for source, start, pieceLength in scratch.iterPieces():
+            if source is view:
+                if start != position or pending:
+                    shift = addEdit(start)
+                position = start + pieceLength
+            else:
+                pending.append(source[start:start + pieceLength])
+        if position != length or pending:
+            shift = addEdit(length)
+        return BatchDelta(edits, inverseEdits, self.textEditor.clipboard, clipboard)
 
     def execute(self):
-        self.textEditor.paste()
+        self.delta = self.compile()
+        self.delta.apply(self.textEditor)
+        self.textEditor.selection = [0, 0]
+
+    def undo(self):
+        if self.delta:
+            self.delta.revert(self.textEditor)
+
+    def redo(self):
+        if self.delta:
+            self.delta.apply(self.textEditor)
+
+class UndoJournal(object):
+    """
+       Keeps executed commands for undo and redo. Each entry only holds the
+       command's delta, and the oldest entries are dropped once the deltas
+       take up more than maxSize characters.
+    """
+    def __init__(self, maxSize=1024 * 1024):
+        self.maxSize = maxSize
+        self.size = 0
+        self.undoStack = deque()
+        self.redoStack = []
+
+    def execute(self, command):
+        command.execute()
+        self.record(command)
+
+    def record(self, command):
+        for discarded in self.redoStack:
+            self.size -= discarded.delta.size()
+        del self.redoStack[:]
+        self.undoStack.append(command)
+        self.size += command.delta.size()
+        self.evict()
+
+    def evict(self):
+        while self.size > self.maxSize and self.undoStack:
+            oldest = self.undoStack.popleft()
+            self.size -= oldest.delta.size()
 
     def undo(self):
-        self.textEditor.loadSettings(self.previousSettings)
+        if not self.undoStack:
+            return None
+        command = self.undoStack.pop()
+        command.undo()
+        self.redoStack.append(command)
+        return command
+
+    def redo(self):
+        if not self.redoStack:
+            return None
+        command = self.redoStack.pop()
+        command.redo()
+        self.undoStack.append(command)
+        return command
+
+if __name__ == "__main__":
+    textFile = TextEditor("Let's see how this string of words can go with all the commands")
+
+    cutSomeWords = CutCommand(textFile, [5, 10])
+    cutSomeWords.execute()
+    print textFile.value
+    cutSomeWords.undo()
+    print textFile.value
 
-textFile = TextEditor("Let's see how this string of words can go with all the commands")
+    copySomeWords = CopyCommand(textFile, [5, 10])
+    print textFile.value
+    copySomeWords.execute()
+    print textFile.value
 
-cutSomeWords = CutCommand(textFile, [5, 10])
-cutSomeWords.execute()
-print textFile.value
-cutSomeWords.undo()
-print textFile.value
+    pasteSomeWords = PasteCommand(textFile, [10, 10])
+    print textFile.value
+    pasteSomeWords.execute()
+    print textFile.value
 
-copySomeWords = CopyCommand(textFile, [5, 10])
-print textFile.value
-copySomeWords.execute()
-print textFile.value
+    journal = UndoJournal()
+    journal.execute(CutCommand(textFile, [0, 6]))
+    print textFile.value
+    journal.undo()
+    print textFile.value
+    journal.redo()
+    print textFile.value
 
-pasteSomeWords = PasteCommand(textFile, [10, 10])
-print textFile.value
-pasteSomeWords.execute()
-print textFile.value
+    macro = CommandBatch(textFile, [
+        CopyCommand(textFile, [0, 4]),
+        PasteCommand(textFile, [0, 0]),
+        CutCommand(textFile, [8, 12])
+    ])
+    journal.execute(macro)
+    print textFile.value
+    journal.undo()
+    print textFile.value
@@ -6,56 +6,266 @@
    him/her, for example childrens. In this case, composite pattern can be used.
 """
 
+from array import array
+from collections import deque
+
 class Person:
 	def __init__(self, name, age):
 		self.name = name
 		self.age = age
 		self.children = []
+		self.parent = None
+		# Aggregates of the subtree rooted here, kept up to date by registerChild and disownChild
+		self.subtreeSize = 1
+		self.ageSum = age
+		self.generations = 1
 
 	def registerChild(self, child):
+		person = self
+		while person is not None:
+			if person is child:
+				raise ValueError("A person can't be registered as a child of their own descendent")
+			person = person.parent
+		if child.parent is not None:
+			child.parent.disownChild(child.parent.children.index(child))
 		self.children.append(child)
+		child.parent = self
+		generations = child.generations
+		person = self
+		while person is not None:
+			generations += 1
+			person.subtreeSize += child.subtreeSize
+			person.ageSum += child.ageSum
+			if generations > person.generations:
+				person.generations = generations
+			person = person.parent
 
 	def disownChild(self, index):
+		child = self.children[index]
 		del self.children[index]
+		child.parent = None
+		heightChanged = True
+		person = self
+		while person is not None:
+			person.subtreeSize -= child.subtreeSize
+			person.ageSum -= child.ageSum
+			if heightChanged:
+				generations = 1 + max([eachChild.generations for eachChild in person.children] or [0])
+				heightChanged = generations != person.generations
+				person.generations = generations
+			person = person.parent
+
+	def setAge(self, age):
+		ageDelta = age - self.age
+		self.age = age
+		person = self
+		while person is not None:
+			person.ageSum += ageDelta
+			person = person.parent
+
+	def getDescendentCount(self):
+		return self.subtreeSize - 1
+
+	def getGenerations(self):
+		return self.generations
+
+	def getAgeSum(self):
+		return self.ageSum
+
+	def canExpand(self, level, prune, maxLevel):
+		if maxLevel is not None and level >= maxLevel:
+			return False
+		return not (prune and prune(self))
+
+	# The traversals below yield (person, level) pairs lazily, this person being level 1.
+	# prune(person) returning True skips that person's descendents, stop(person) returning
+	# True ends the traversal right after that person and maxLevel bounds the depth.
+
+	def preOrder(self, prune=None, stop=None, maxLevel=None):
+		stack = [(self, 1)]
+		while stack:
+			person, level = stack.pop()
+			yield person, level
+			if stop and stop(person):
+				return
+			if person.canExpand(level, prune, maxLevel):
+				for eachDescendent in reversed(person.children):
+					stack.append((eachDescendent, level + 1))
+
+	def postOrder(self, prune=None, stop=None, maxLevel=None):
+		stack = [(self, 1, False)]
+		while stack:
+			person, level, expanded = stack.pop()
+			if not expanded and person.children and person.canExpand(level, prune, maxLevel):
+				stack.append((person, level, True))
+				for eachDescendent in reversed(person.children):
+					stack.append((eachDescendent, level + 1, False))
+				continue
+			yield person, level
+			if stop and stop(person):
+				return
+
+	def breadthFirst(self, prune=None, stop=None, maxLevel=None):
+		queue = deque([(self, 1)])
+		while queue:
+			person, level = queue.popleft()
+			yield person, level
+			if stop and stop(person):
+				return
+			if person.canExpand(level, prune, maxLevel):
+				for eachDescendent in person.children:
+					queue.append((eachDescendent, level + 1))
 
 	def listDescendents(self):
-		currentPerson = self
-		def recursiveGet(person, level):
+		for person, level in self.preOrder():
 			print "|" + "-"*(level*2) + " Current Person: %s, Level: %d" % (person.name, level)
-			if len(person.children) > 0:
-				for eachDescendent in person.children:
-					recursiveGet(eachDescendent, level + 1)
 
-		recursiveGet(currentPerson, 1)
+class PersonTree:
+	"""
+	   Compact store for very large family trees. Every person is an integer id
+	   and the tree is kept in flat arrays of parent, first child and next sibling
+	   ids. Names are interned into a table and ages are packed into bytes.
+	   Traversals follow the sibling links, so no recursion is needed.
+	"""
+	NONE = -1
+
+	def __init__(self):
+		self.parent = array('i')
+		self.firstChild = array('i')
+		self.lastChild = array('i')
+		self.nextSibling = array('i')
+		self.nameIds = array('I')
+		self.ages = array('B')
+		self.names = []
+		self.nameTable = {}
+
+	def internName(self, name):
+		nameId = self.nameTable.get(name)
+		if nameId is None:
+			nameId = len(self.names)
+			self.names.append(name)
+			self.nameTable[name] = nameId
+		return nameId
+
+	def addPerson(self, name, age, parent=NONE):
+		person = len(self.parent)
+		self.parent.append(parent)
+		self.firstChild.append(self.NONE)
+		self.lastChild.append(self.NONE)
+		self.nextSibling.append(self.NONE)
+		self.nameIds.append(self.internName(name))
+		self.ages.append(age)
+		if parent != self.NONE:
+			if self.firstChild[parent] == self.NONE:
+				self.firstChild[parent] = person
+			else:
+				self.nextSibling[self.lastChild[parent]] = person
+			self.lastChild[parent] = person
+		return person
+
+	def addPersons(self, person):
+		# Copies a Person hierarchy into the store, returns the id of its root
+		root = self.addPerson(person.name, person.age)
+		stack = [(person, root)]
+		while stack:
+			current, currentId = stack.pop()
+			for child in current.children:
+				stack.append((child, self.addPerson(child.name, child.age, currentId)))
+		return root
+
+	def getName(self, person):
+		return self.names[self.nameIds[person]]
+
+	def getAge(self, person):
+		return self.ages[person]
+
+	def walk(self, root):
+		# Yields (id, level) pairs in pre-order, level 0 being the root
+		firstChild = self.firstChild
+		nextSibling = self.nextSibling
+		parent = self.parent
+		person = root
+		level = 0
+		while True:
+			yield person, level
+			if firstChild[person] != self.NONE:
+				person = firstChild[person]
+				level += 1
+				continue
+			while person != root and nextSibling[person] == self.NONE:
+				person = parent[person]
+				level -= 1
+			if person == root:
+				return
+			person = nextSibling[person]
+
+	def preorder(self, root):
+		for person, level in self.walk(root):
+			yield person
+
+	def subtreeSize(self, root):
+		size = 0
+		for person, level in self.walk(root):
+			size += 1
+		return size
+
+	def depth(self, person):
+		depth = 0
+		while self.parent[person] != self.NONE:
+			person = self.parent[person]
+			depth += 1
+		return depth
+
+	def listDescendents(self, root):
+		for person, level in self.walk(root):
+			print "|" + "-"*((level + 1)*2) + " Current Person: %s, Level: %d" % (self.getName(person), level + 1)
+
+if __name__ == "__main__":
+	print "Tim is a person and has two songs, Tom and Teddy"
+
+	tim = Person("Tim", 65)
+	tom = Person("Tom", 32)
+	ted = Person("Teddy", 28)
+
+	tim.registerChild(tom)
+	tim.registerChild(ted)
+
+	print "Tom is married and has a daughter, Cheryl"
 
-print "Tim is a person and has two songs, Tom and Teddy"
+	cheryl = Person("Cheryl", 5)
+	tom.registerChild(cheryl)
 
-tim = Person("Tim", 65)
-tom = Person("Tom", 32)
-ted = Person("Teddy", 28)
+	print "--- Descendents of Tim"
+	tim.listDescendents()
 
-tim.registerChild(tom)
-tim.registerChild(ted)
+	print "--- Descendents of Tom"
+	tom.listDescendents()
 
-print "Tom is married and has a daughter, Cheryl"
+	print "We forgot to add the great grandfather, Joe"
+	joe = Person("Joe", 90)
+	joe.registerChild(tim)
+	joe.listDescendents()
 
-cheryl = Person("Cheryl", 5)
-tom.registerChild(cheryl)
+	print "Teddy gets married and gets a son, Paul"
+	paul = Person("Paul", 1)
+	ted.registerChild(paul)
 
-print "--- Descendents of Tim"
-tim.listDescendents()
+	print "Now the hierarchy gets even larger"
+	joe.listDescendents()
 
-print "--- Descendents of Tom"
-tom.listDescendents()
+	print "Joe has %d descendents over %d generations, their ages sum up to %d" % (
+		joe.getDescendentCount(), joe.getGenerations(), joe.getAgeSum())
 
-print "We forgot to add the great grandfather, Joe"
-joe = Person("Joe", 90)
-joe.registerChild(tim)
-joe.listDescendents()
+	print "Joe's family down to his grandchildren, breadth first"
+	print [person.name for person, level in joe.breadthFirst(maxLevel=3)]
 
-print "Teddy gets married and gets a son, Paul"
-paul = Person("Paul", 1)
-ted.registerChild(paul)
+	print "Looking for the first descendent younger than 10"
+	for person, level in joe.preOrder(stop=lambda person: person.age < 10):
+		pass
+	print person.name
 
-print "Now the hierarchy gets even larger"
-joe.listDescendents()
\ No newline at end of file
+	print "The same hierarchy in the compact tree store"
+	familyTree = PersonTree()
+	joeId = familyTree.addPersons(joe)
+	familyTree.listDescendents(joeId)
+	print "Joe has %d descendents including himself" % familyTree.subtreeSize(joeId)
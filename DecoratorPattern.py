@@ -44,6 +44,7 @@ class BronzeMembership(Membership):
     def getCost(self):
         return self.cost
 
-bronzeMember = BronzeMembership(["CanView"], 0.8)
-print bronzeMember.getAddons()
-print bronzeMember.getCost()
+if __name__ == "__main__":
+    bronzeMember = BronzeMembership(["CanView"], 0.8)
+    print bronzeMember.getAddons()
+    print bronzeMember.getCost()
@@ -59,18 +59,6 @@ class Cart:
 			"total": self.total
 		}
 
-item1 = Item("Green Tea", 6.0)
-item2 = Item("Black Tea", 5.0)
-cart = Cart()
-cart.addItem(item1)
-cart.addItem(item1)
-cart.addItem(item2)
-cart.totalFromItems()
-cart.checkOut()
-cart.addShipping(2.0)
-cart.makePayment()
-pprint(cart.displayCartInfo())
-
 """
    Use facade pattern to simplify the checking out process of one item only
 """
@@ -87,6 +75,19 @@ class CartFacade:
 		self.cart.makePayment()
 		pprint(self.cart.displayCartInfo())
 
-print "---- From CartFacade (Reduced to 2 lines of code) ----"
-cartFacade = CartFacade(Cart())
-cartFacade.quickBuy(item1)
\ No newline at end of file
+if __name__ == "__main__":
+	item1 = Item("Green Tea", 6.0)
+	item2 = Item("Black Tea", 5.0)
+	cart = Cart()
+	cart.addItem(item1)
+	cart.addItem(item1)
+	cart.addItem(item2)
+	cart.totalFromItems()
+	cart.checkOut()
+	cart.addShipping(2.0)
+	cart.makePayment()
+	pprint(cart.displayCartInfo())
+
+	print "---- From CartFacade (Reduced to 2 lines of code) ----"
+	cartFacade = CartFacade(Cart())
+	cartFacade.quickBuy(item1)
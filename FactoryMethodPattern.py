@@ -9,12 +9,25 @@
    a normal user account
 
    In this example I use npm:prompt to get user input
+
+   Run it without arguments to be asked for a user type, or pass a file (or
+   pipe into stdin) with one user type per line to create them in bulk and
+   see the creation throughput.
 """
 
+import argparse, itertools, sys, timeit
+from array import array
+
 class SuperAdministrator(object):
     def createUser(self):
         return
 
+    def createUsers(self, count):
+        # Every user goes through createUser, the privilege sets are shared through
+        # PrivilegeSet.get. Creators that can build a batch faster override this
+        createUser = self.createUser
+        return [createUser() for i in xrange(count)]
+
 class AdminCreator(SuperAdministrator):
     def createUser(self):
         return Admin()
@@ -27,15 +40,59 @@ class UserCreator(SuperAdministrator):
     def createUser(self):
         return User()
 
+class PrivilegeSet(object):
+    """
+       Immutable set of privileges stored as a bitmask, every privilege name
+       gets its own bit. There is one shared instance per combination, so users
+       of the same role all point to the same set and checks are bit tests.
+    """
+    __slots__ = ["names", "mask"]
+    bits = {}
+    byMask = {}
+    byNames = {}
+
+    def __init__(self, names, mask):
+        self.names = names
+        self.mask = mask
+
+    @classmethod
+    def get(cls, names):
+        names = tuple(names)
+        privilegeSet = cls.byNames.get(names)
+        if privilegeSet is None:
+            mask = 0
+            for name in names:
+                if name not in cls.bits:
+                    cls.bits[name] = 1 << len(cls.bits)
+                mask |= cls.bits[name]
+            privilegeSet = cls.byMask.get(mask)
+            if privilegeSet is None:
+                privilegeSet = cls.byMask[mask] = cls(names, mask)
+            cls.byNames[names] = privilegeSet
+        return privilegeSet
+
+    def has(self, name):
+        return self.mask & self.bits.get(name, 0) != 0
+
+    def __contains__(self, name):
+        return self.has(name)
+
+    def __iter__(self):
+        return iter(self.names)
+
 class User(object):
     def __init__(self, privileges=None):
         # Default CanView
-        self.privileges = ["CanView"];
         if privileges:
-            self.privileges.extend(privileges)
+            self.privileges = PrivilegeSet.get(["CanView"] + privileges)
+        else:
+            self.privileges = PrivilegeSet.get(["CanView"])
 
     def getPrivileges(self):
-        return self.privileges
+        return list(self.privileges)
+
+    def hasPrivilege(self, name):
+        return self.privileges.has(name)
 
 class Admin(User):
     def __init__(self):
@@ -45,14 +102,129 @@ class Editor(User):
     def __init__(self):
         super(Editor, self).__init__(["CanEdit"])
 
-userType = raw_input("What kind of user do you wish to create? ['admin', 'editor', 'normal']")
+CREATORS = {
+    "admin": AdminCreator(),
+    "editor": EditorCreator(),
+    "normal": UserCreator()
+}
+
+def normalizeUserType(userType):
+    # Anything that is not an admin or an editor is a normal user
+    return userType if userType in CREATORS else "normal"
+
+def getCreator(userType):
+    return CREATORS[normalizeUserType(userType)]
+
+class UserColumns(object):
+    """
+       Columnar result of a bulk creation, a user type id and a privileges id
+       per user, with the tables the ids point into.
+    """
+    def __init__(self):
+        self.typeIds = array("B")
+        self.privilegesIds = array("B")
+        self.userTypes = []
+        self.privileges = []
+        self.typeTable = {}
+        self.typePrivileges = []
+
+    def typeId(self, userType):
+        userType = normalizeUserType(userType)
+        typeId = self.typeTable.get(userType)
+        if typeId is None:
+            typeId = self.typeTable[userType] = len(self.userTypes)
+            self.userTypes.append(userType)
+            privileges = getCreator(userType).createUser().privileges
+            if privileges not in self.privileges:
+                self.privileges.append(privileges)
+            self.typePrivileges.append(self.privileges.index(privileges))
+        return typeId
+
+    def extend(self, userTypes):
+        typeIds = [self.typeId(userType) for userType in userTypes]
+        typePrivileges = self.typePrivileges
+        self.typeIds.extend(typeIds)
+        self.privilegesIds.extend(typePrivileges[typeId] for typeId in typeIds)
+
+    def __len__(self):
+        return len(self.typeIds)
+
+    def getPrivileges(self, index):
+        return list(self.privileges[self.privilegesIds[index]])
+
+def createBatches(userTypes, batchSize):
+    userTypes = iter(userTypes)
+    while True:
+        batch = list(itertools.islice(userTypes, batchSize))
+        if not batch:
+            return
+        yield batch
+
+def buildBatch(batch):
+    groups = {}
+    for position, userType in enumerate(batch):
+        groups.setdefault(normalizeUserType(userType), []).append(position)
+    users = [None] * len(batch)
+    for userType, positions in groups.items():
+        for position, user in zip(positions, getCreator(userType).createUsers(len(positions))):
+            users[position] = user
+    return users
 
-if userType == "admin":
-    userFactory = AdminCreator()
-elif userType == "editor":
-    userFactory = EditorCreator()
-else:
-    userFactory = UserCreator()
+def createUsers(userTypes, batchSize=10000, columnar=False):
+    """
+       Creates one user per type in userTypes, which can be any iterable and is
+       read batchSize items at a time. Each batch is grouped by type so every
+       creator is called once per batch. Yields the users in input order, or
+       with columnar set returns a UserColumns instead.
+    """
+    batches = createBatches(userTypes, batchSize)
+    if columnar:
+        columns = UserColumns()
+        for batch in batches:
+            columns.extend(batch)
+        return columns
+    return (user for batch in batches for user in buildBatch(batch))
+
+def readUserTypes(stream):
+    for line in stream:
+        userType = line.strip()
+        if userType:
+            yield userType
+
+def createFromStream(stream, batchSize=10000, columnar=False):
+    """
+       Creates a user for every non empty line of stream and returns how many
+       were created and how long it took in seconds.
+    """
+    timeBefore = timeit.default_timer()
+    users = createUsers(readUserTypes(stream), batchSize, columnar)
+    if columnar:
+        userCount = len(users)
+    else:
+        userCount = sum(1 for user in users)
+    return userCount, timeit.default_timer() - timeBefore
+
+def askUser():
+    userType = raw_input("What kind of user do you wish to create? ['admin', 'editor', 'normal']")
+    user = getCreator(userType).createUser()
+    print user.getPrivileges()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create users with the factory method creators")
+    parser.add_argument("input", nargs="?", help="file with one user type per line, - for stdin")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--columnar", action="store_true", help="create columns instead of user objects")
+    args = parser.parse_args(argv)
+
+    if args.input is None and sys.stdin.isatty():
+        askUser()
+        return
+    if args.input in (None, "-"):
+        userCount, seconds = createFromStream(sys.stdin, args.batch_size, args.columnar)
+    else:
+        with open(args.input) as stream:
+            userCount, seconds = createFromStream(stream, args.batch_size, args.columnar)
+    print "Created %d users in %dms (%d users/s)" % (userCount, seconds * 1000, userCount / seconds if seconds else 0)
 
-user = userFactory.createUser()
-print user.getPrivileges()
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,19 @@
    can be used here to use the same configuration if both LEDs have the same color,
    saving memory space and making the process more efficient.
 """
-import random, timeit
+import gc, json, multiprocessing, random, resource, sys, threading, timeit, weakref
+from array import array
+from collections import OrderedDict
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
 
 COLORS = ['yellow', 'red', 'blue', 'green', 'purple', 'orange', 'cyan', 'white']
 
@@ -15,49 +27,271 @@ class LED:
 	def __init__(self, color):
 		self.color = color
 
-class LEDFactory:
+class StrongRetention:
+	"""
+	   Retention policies decide how long the factory keeps its flyweights and
+	   count hits, misses and evictions so the cache can be sized. This one keeps
+	   every flyweight forever.
+	"""
 	def __init__(self):
-		self.ledTypes = {}
+		self.items = {}
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, key):
+		item = self.items.get(key)
+		if item is None:
+			self.misses += 1
+		else:
+			self.hits += 1
+		return item
+
+	def put(self, key, item):
+		self.items[key] = item
+
+	def __len__(self):
+		return len(self.items)
+
+	def getStats(self):
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"size": len(self)
+		}
+
+class WeakRetention(StrongRetention):
+	"""
+	   Only holds weak references, a flyweight is dropped once nothing else
+	   (such as a tree) refers to it.
+	"""
+	def get(self, key):
+		reference = self.items.get(key)
+		item = reference() if reference is not None else None
+		if item is None:
+			self.misses += 1
+		else:
+			self.hits += 1
+		return item
+
+	def put(self, key, item):
+		def collected(reference):
+			if self.items.get(key) is reference:
+				del self.items[key]
+				self.evictions += 1
+		self.items[key] = weakref.ref(item, collected)
+
+class LRURetention(StrongRetention):
+	"""
+	   Keeps at most maxSize flyweights, evicting the least recently used one.
+	"""
+	def __init__(self, maxSize=256):
+		StrongRetention.__init__(self)
+		self.maxSize = maxSize
+		self.items = OrderedDict()
+
+	def get(self, key):
+		item = self.items.pop(key, None)
+		if item is None:
+			self.misses += 1
+		else:
+			self.hits += 1
+			self.items[key] = item
+		return item
+
+	def put(self, key, item):
+		self.items.pop(key, None)
+		self.items[key] = item
+		while len(self.items) > self.maxSize:
+			self.items.popitem(last=False)
+			self.evictions += 1
+
+class LEDFactory:
+	def __init__(self, retention=None):
+		self.ledTypes = retention if retention is not None else StrongRetention()
+		# Every flyweight also gets a small integer id, an index into ledTable.
+		# Flyweights with an id stay in ledTable whatever the retention policy.
+		self.ledIds = {}
+		self.ledTable = []
 
 	def getLED(self, color):
 		ledTypes = self.ledTypes
-		if color in ledTypes:
-			led = ledTypes[color]
+		led = ledTypes.get(color)
+		if led is None:
+			# An LED pinned in ledTable may have been evicted by the policy, reuse it
+			ledId = self.ledIds.get(color)
+			led = self.ledTable[ledId] if ledId is not None else LED(color)
+			ledTypes.put(color, led)
+		return led
+
+	def getLEDId(self, color):
+		ledIds = self.ledIds
+		if color in ledIds:
+			ledId = ledIds[color]
 		else:
-			led = LED(color)
-			ledTypes[color] = led
+			ledId = len(self.ledTable)
+			self.ledTable.append(self.getLED(color))
+			ledIds[color] = ledId
+		return ledId
+
+class ConcurrentLEDFactory:
+	"""
+	   LEDFactory that can be shared between threads. The flyweights are spread
+	   over several shards, each guarded by its own lock. Lookups of an existing
+	   LED read the shard without locking, only a miss takes the shard's lock and
+	   checks again before creating the LED, so there is exactly one LED per color.
+	"""
+	def __init__(self, shardCount=16):
+		self.shards = [{} for i in range(shardCount)]
+		self.locks = [threading.Lock() for i in range(shardCount)]
+
+	def getLED(self, color):
+		index = hash(color) % len(self.shards)
+		shard = self.shards[index]
+		led = shard.get(color)
+		if led is None:
+			with self.locks[index]:
+				led = shard.get(color)
+				if led is None:
+					led = LED(color)
+					shard[color] = led
 		return led
 
 class ChristmasTree:
-	def __init__(self):
-		self.ledFactory = LEDFactory()
+	def __init__(self, ledFactory=None):
+		self.ledFactory = ledFactory or LEDFactory()
 		self.leds = []
 
 	def putLED(self):
 		randChoice = random.choice(COLORS)
 		self.leds.append(self.ledFactory.getLED(randChoice))
 
-xmasTree = ChristmasTree()
+class CompactChristmasTree:
+	"""
+	   Keeps one byte per LED, the id of its flyweight in the factory, instead of
+	   a reference to the LED object. Supports up to 256 different flyweights.
+	"""
+	def __init__(self, ledFactory=None):
+		self.ledFactory = ledFactory or LEDFactory()
+		self.ledIds = array('B')
+
+	def putLED(self):
+		randChoice = random.choice(COLORS)
+		self.ledIds.append(self.ledFactory.getLEDId(randChoice))
+
+	def putLEDs(self, count):
+		colorIds = [self.ledFactory.getLEDId(color) for color in COLORS]
+		if numpy is not None:
+			ids = numpy.array(colorIds, dtype=numpy.uint8)[numpy.random.randint(0, len(colorIds), count)]
+			self.ledIds.fromstring(ids.tostring())
+		else:
+			self.ledIds.extend(random.choice(colorIds) for i in xrange(count))
+
+	def __len__(self):
+		return len(self.ledIds)
+
+	def __iter__(self):
+		ledTable = self.ledFactory.ledTable
+		for ledId in self.ledIds:
+			yield ledTable[ledId]
 
-timeBefore = timeit.default_timer()
+def decorateWithObjects(ledCount):
+	xmasTree = ChristmasTree()
+	for i in xrange(ledCount):
+		xmasTree.leds.append(LED(random.choice(COLORS)))
+	return xmasTree, sys.getsizeof(xmasTree.leds)
 
-for i in range(0, 100000):
-	xmasTree.putLED()
+def decorateWithFlyWeight(ledCount):
+	xmasTree = ChristmasTree()
+	for i in xrange(ledCount):
+		xmasTree.putLED()
+	return xmasTree, sys.getsizeof(xmasTree.leds)
 
-timeTaken = (timeit.default_timer() - timeBefore) * 1000
+def decorateWithCompactIds(ledCount):
+	xmasTree = CompactChristmasTree()
+	xmasTree.putLEDs(ledCount)
+	return xmasTree, sys.getsizeof(xmasTree.ledIds)
 
-print 'Time Taken (With FlyWeight): %dms' % timeTaken
+BENCHMARKS = [
+	('objects', decorateWithObjects),
+	('flyweight', decorateWithFlyWeight),
+	('compact', decorateWithCompactIds)
+]
 
-anotherXmasTree = ChristmasTree()
+def measure(name, decorate, ledCount, results):
+	# Runs in its own process so that the peak RSS belongs to this benchmark only
+	if tracemalloc is not None:
+		tracemalloc.start()
+	gc.collect()
+	objectsBefore = len(gc.get_objects())
+	rssBefore = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	timeBefore = timeit.default_timer()
+	xmasTree, containerBytes = decorate(ledCount)
+	timeTaken = (timeit.default_timer() - timeBefore) * 1000
+	rssAfter = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	gc.collect()
+	objectsAfter = len(gc.get_objects())
+	result = {
+		'benchmark': name,
+		'leds': ledCount,
+		'timeMs': timeTaken,
+		'containerBytes': containerBytes,
+		# ru_maxrss is in kilobytes on Linux
+		'peakRssKb': rssAfter,
+		'peakRssGrowthKb': rssAfter - rssBefore,
+		# Objects the garbage collector tracks, so instances and containers but not strings or ints
+		'trackedObjects': objectsAfter - objectsBefore
+	}
+	if tracemalloc is not None:
+		snapshot = tracemalloc.take_snapshot()
+		result['allocatedBlocks'] = sum(stat.count for stat in snapshot.statistics('filename'))
+		result['tracedPeakBytes'] = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+	results.put(result)
 
-timeBefore2 = timeit.default_timer()
+def runBenchmarks(ledCounts=(1000, 10000, 100000, 1000000), output=sys.stdout):
+	"""
+	   Runs every benchmark for every number of LEDs, each in a fresh process,
+	   and writes one JSON object per line to output. trackedObjects counts the
+	   objects still alive after decorating. allocatedBlocks and tracedPeakBytes
+	   are only written when tracemalloc is available.
+	"""
+	allResults = []
+	for ledCount in ledCounts:
+		for name, decorate in BENCHMARKS:
+			results = multiprocessing.Queue()
+			process = multiprocessing.Process(target=measure, args=(name, decorate, ledCount, results))
+			process.start()
+			result = results.get()
+			process.join()
+			output.write(json.dumps(result, sort_keys=True) + '\n')
+			allResults.append(result)
+	return allResults
 
-for i in range(0, 100000):
-	randChoice = random.choice(COLORS)
-	led = LED(randChoice)
-	anotherXmasTree.leds.append(led)
+def decorateConcurrently(threadCount, ledCount):
+	sharedTree = ChristmasTree(ConcurrentLEDFactory())
+	def decorate():
+		for i in range(0, ledCount // threadCount):
+			sharedTree.putLED()
+	threads = [threading.Thread(target=decorate) for i in range(threadCount)]
+	timeBefore = timeit.default_timer()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return sharedTree, (timeit.default_timer() - timeBefore) * 1000
 
-timeTaken2 = (timeit.default_timer() - timeBefore2) * 1000
+if __name__ == "__main__":
+	runBenchmarks((1000, 10000, 100000))
 
-print 'Time Taken (Without FlyWeight): %dms' % timeTaken2
+	for retention in [StrongRetention(), WeakRetention(), LRURetention(4)]:
+		retentionTree = ChristmasTree(LEDFactory(retention))
+		for i in range(0, 10000):
+			retentionTree.putLED()
+		print '%s: %s' % (retention.__class__.__name__, retention.getStats())
 
+	for threadCount in [1, 2, 4, 8]:
+		sharedTree, timeTaken3 = decorateConcurrently(threadCount, 100000)
+		sharedLEDs = len(set(id(led) for led in sharedTree.leds))
+		print 'Time Taken (With concurrent FlyWeight, %d threads): %dms, %d shared LEDs' % (threadCount, timeTaken3, sharedLEDs)
@@ -55,19 +55,20 @@ class DictIterator(Iterator):
         else:
             return True
 
-listItems = [1, 2, 3, {"i": 4}]
-dictItems = {
-    "one": 1,
-    "two": 2,
-    "three": 3,
-    "four": {
-        "i": 4
+if __name__ == "__main__":
+    listItems = [1, 2, 3, {"i": 4}]
+    dictItems = {
+        "one": 1,
+        "two": 2,
+        "three": 3,
+        "four": {
+            "i": 4
+        }
     }
-}
 
-listIterator = ListIterator(listItems)
-dictIterator = DictIterator(dictItems)
+    listIterator = ListIterator(listItems)
+    dictIterator = DictIterator(dictItems)
 
-while listIterator.hasNext() and dictIterator.hasNext():
-    print listIterator.next()
-    print dictIterator.next()
\ No newline at end of file
+    while listIterator.hasNext() and dictIterator.hasNext():
+        print listIterator.next()
+        print dictIterator.next()
@@ -18,6 +18,10 @@
    call the model to manipulate data, state and then update the view accordingly.
 """
 
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
 class Song:
 	def __init__(self, song):
 		self.song = song
@@ -38,38 +42,97 @@ class PlayerModel:
 		self.volume = volume
 		self.song = ''
 		self.viewObservers = []
+		# Views subscribed to specific fields, indexed by field
+		self.fieldObservers = {}
+		self.viewFields = {}
+		# Changed fields are collected here and sent to the views in one notification
+		self.dirtyFields = set()
+		self.transactionDepth = 0
+		self.deferred = False
 
 	def setVolume(self, volume):
 		self.volume = volume
-		self.updateViews()
+		self.fieldsChanged('volume')
 
 	def getVolume(self):
 		return self.volume
 
 	def setSong(self, song):
 		self.song = song
-		self.updateViews()
+		self.fieldsChanged('song', 'status')
 
 	def playSong(self):
 		self.song.play()
-		self.updateViews()
+		self.fieldsChanged('status')
 
 	def stopSong(self):
 		self.song.stop()
-		self.updateViews()
-
-	def registerViewObserver(self, view):
-		self.viewObservers.append(view)
+		self.fieldsChanged('status')
+
+	def fieldsChanged(self, *fields):
+		self.dirtyFields.update(fields)
+		if self.transactionDepth == 0 and not self.deferred:
+			self.flush()
+
+	@contextmanager
+	def transaction(self):
+		# Views are notified once, when the outermost transaction ends
+		self.transactionDepth += 1
+		try:
+			yield self
+		finally:
+			self.transactionDepth -= 1
+			if self.transactionDepth == 0 and not self.deferred:
+				self.flush()
+
+	def setDeferred(self, deferred):
+		# When deferred, changes are only sent when flush() is called, e.g. once per UI tick
+		self.deferred = deferred
+		if not deferred and self.transactionDepth == 0:
+			self.flush()
+
+	def flush(self):
+		if not self.dirtyFields:
+			return
+		changedFields = frozenset(self.dirtyFields)
+		self.dirtyFields.clear()
+		self.updateViews(changedFields)
+
+	def registerViewObserver(self, view, fields=None):
+		# Without fields the view is notified of every change
+		if fields is None:
+			self.viewObservers.append(view)
+			return
+		self.viewFields[view] = frozenset(fields)
+		for field in fields:
+			self.fieldObservers.setdefault(field, []).append(view)
 
 	def removeViewObserver(self, view):
-		self.viewObservers.remove(view)
+		if view in self.viewFields:
+			for field in self.viewFields.pop(view):
+				self.fieldObservers[field].remove(view)
+		else:
+			self.viewObservers.remove(view)
 
-	def updateViews(self):
+	def updateViews(self, changedFields=None):
 		for view in self.viewObservers:
-			view.update(self)
-
-	def toString(self):
-		print 'Song Status: %s\n Volume: %d' % (self.song.getStatus(), self.getVolume())
+			view.update(self, changedFields)
+		if changedFields is None:
+			changedFields = self.fieldObservers.keys()
+		interestedViews = OrderedDict()
+		for field in changedFields:
+			for view in self.fieldObservers.get(field, ()):
+				interestedViews.setdefault(view, set()).add(field)
+		for view, fields in interestedViews.items():
+			view.update(self, frozenset(fields))
+
+	def toString(self, fields=None):
+		lines = []
+		if fields is None or 'song' in fields or 'status' in fields:
+			lines.append('Song Status: %s' % self.song.getStatus())
+		if fields is None or 'volume' in fields:
+			lines.append('Volume: %d' % self.getVolume())
+		print '\n '.join(lines)
 
 
 class PlayerController:
@@ -92,12 +155,96 @@ class PlayerController:
 		volume = 80
 		self.model.setVolume(volume)
 
+class QueuedPlayerController(PlayerController):
+	"""
+	   Controller that queues actions and returns straight away. A worker thread
+	   runs them, so slow steps like the file dialog or loading a song do not
+	   block the caller, and the model is only touched from that thread. A new
+	   volume change replaces one still waiting in the queue, and every batch of
+	   queued actions reaches the views as a single update.
+	"""
+	def __init__(self, model, view):
+		PlayerController.__init__(self, model, view)
+		self.pending = deque()
+		self.mergeable = {}
+		self.errors = []
+		self.busy = False
+		self.closed = False
+		self.condition = threading.Condition()
+		self.worker = threading.Thread(target=self.work)
+		self.worker.daemon = True
+		self.worker.start()
+
+	def submit(self, action, args=(), mergeKey=None):
+		with self.condition:
+			if mergeKey is not None and mergeKey in self.mergeable:
+				self.mergeable[mergeKey][1] = args
+			else:
+				entry = [action, args]
+				self.pending.append(entry)
+				if mergeKey is not None:
+					self.mergeable[mergeKey] = entry
+			self.condition.notify_all()
+
+	def openFile(self):
+		self.submit(self.loadFile)
+
+	def loadFile(self):
+		PlayerController.openFile(self)
+
+	def playButtonPressed(self):
+		self.submit(self.model.playSong)
+
+	def stopButtonPressed(self):
+		self.submit(self.model.stopSong)
+
+	def volumeSliderChanged(self, volume=80):
+		self.submit(self.model.setVolume, (volume,), 'volume')
+
+	def work(self):
+		while True:
+			with self.condition:
+				while not self.pending and not self.closed:
+					self.condition.wait()
+				if not self.pending:
+					return
+				batch = list(self.pending)
+				self.pending.clear()
+				self.mergeable.clear()
+				self.busy = True
+			try:
+				# The views are updated when the transaction ends, so they are covered too
+				with self.model.transaction():
+					for action, args in batch:
+						try:
+							action(*args)
+						except Exception as error:
+							self.errors.append(error)
+			except Exception as error:
+				self.errors.append(error)
+			finally:
+				with self.condition:
+					self.busy = False
+					self.condition.notify_all()
+
+	def join(self):
+		# Waits until every queued action has reached the model
+		with self.condition:
+			while self.pending or self.busy:
+				self.condition.wait()
+
+	def close(self):
+		with self.condition:
+			self.closed = True
+			self.condition.notify_all()
+		self.worker.join()
+
 class PlayerView:
 	def __init__(self):
 		self.song = ''
 
-	def update(self, model):
-		model.toString()
+	def update(self, model, changedFields=None):
+		model.toString(changedFields)
 
 	def popupFileDialog(self):
 		return self.song
@@ -105,18 +252,37 @@ class PlayerView:
 	def uploadSong(self, song):
 		self.song = song
 
-song1 = Song('Imagine - John Lennon')
-song2 = Song('It\'s my life - Bon Jovi')
-
-jukeboxDisplay = PlayerView()
-jukeboxModel = PlayerModel(50)
-jukeboxModel.registerViewObserver(jukeboxDisplay)
-jukeboxController = PlayerController(jukeboxModel, jukeboxDisplay)
-
-jukeboxDisplay.uploadSong(song1)
-jukeboxController.openFile()
-jukeboxController.playButtonPressed()
-jukeboxController.stopButtonPressed()
-jukeboxController.volumeSliderChanged()
-
-
+if __name__ == "__main__":
+	song1 = Song('Imagine - John Lennon')
+	song2 = Song('It\'s my life - Bon Jovi')
+
+	jukeboxDisplay = PlayerView()
+	jukeboxModel = PlayerModel(50)
+	jukeboxModel.registerViewObserver(jukeboxDisplay)
+	jukeboxController = PlayerController(jukeboxModel, jukeboxDisplay)
+
+	jukeboxDisplay.uploadSong(song1)
+	jukeboxController.openFile()
+	jukeboxController.playButtonPressed()
+	jukeboxController.stopButtonPressed()
+	jukeboxController.volumeSliderChanged()
+
+	volumeDisplay = PlayerView()
+	jukeboxModel.registerViewObserver(volumeDisplay, ['volume'])
+
+	# Dragging the volume slider only re-renders the view once
+	with jukeboxModel.transaction():
+		for volume in range(80, 20, -5):
+			jukeboxModel.setVolume(volume)
+
+	# The volume display is not notified about song changes
+	jukeboxController.playButtonPressed()
+
+	# Actions are queued and rapid volume changes are merged before reaching the model
+	queuedController = QueuedPlayerController(jukeboxModel, jukeboxDisplay)
+	jukeboxDisplay.uploadSong(song2)
+	queuedController.openFile()
+	for volume in range(30, 70, 10):
+		queuedController.volumeSliderChanged(volume)
+	queuedController.join()
+	queuedController.close()
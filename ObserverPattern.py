@@ -10,6 +10,13 @@
    user and the user becomes the subject.
 """
 
+import heapq
+import itertools
+import Queue
+import threading
+import weakref
+from collections import namedtuple
+
 class NotificationData(object):
     def __init__(self, data):
         if self.validData(data):
@@ -23,18 +30,192 @@ class NotificationData(object):
         # Place your logic here
         return True;
 
+class PostRecord(namedtuple("PostRecord", ["name", "url", "description"])):
+    """
+       Compact, immutable alternative to NewPost. The schema is fixed when the
+       class is created, so building a record with a missing or unknown field
+       fails straight away and no per post validation is needed. One record is
+       shared by every follower. Fields can also be read like dictionary keys.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            # Only the fields, not the tuple's methods or attributes
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+class NotificationDispatcher(object):
+    """
+       Delivers notifications on worker threads so the subject does not wait
+       for its observers. Each notification is delivered in chunks of
+       chunkSize observers. At most maxPending notifications wait in the queue,
+       after that dispatch() blocks until the workers catch up. A delivery that
+       raises is counted, kept as lastError and passed to onError if given.
+       Errors raised by onError itself are only counted, in failedHandlers.
+    """
+    def __init__(self, chunkSize=1000, maxPending=100, workerCount=1, onError=None):
+        self.chunkSize = chunkSize
+        self.queue = Queue.Queue(maxPending)
+        self.onError = onError
+        self.failedDeliveries = 0
+        self.failedHandlers = 0
+        self.lastError = None
+        self.errorLock = threading.Lock()
+        self.workers = []
+        for i in range(workerCount):
+            worker = threading.Thread(target=self.work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def dispatch(self, observers, notificationData):
+        # Copying a registry's slots is cheap. The copy is what gets delivered, so
+        # observers removed after this call are still notified, only observers
+        # removed before it and dead weak references are skipped
+        if isinstance(observers, ObserverRegistry):
+            self.queue.put((observers.snapshot(), observers.resolve, notificationData))
+        else:
+            self.queue.put((tuple(observers), None, notificationData))
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                observers, resolve, notificationData = job
+                for start in xrange(0, len(observers), self.chunkSize):
+                    self.deliver(observers[start:start + self.chunkSize], resolve, notificationData)
+            finally:
+                self.queue.task_done()
+
+    def deliver(self, observers, resolve, notificationData):
+        for observer in observers:
+            if resolve is not None:
+                observer = resolve(observer)
+                if observer is None:
+                    continue
+            try:
+                observer.update(notificationData)
+            except Exception as error:
+                self.deliveryFailed(observer, notificationData, error)
+
+    def deliveryFailed(self, observer, notificationData, error):
+        with self.errorLock:
+            self.failedDeliveries += 1
+            self.lastError = error
+        if self.onError:
+            # A failing handler must not stop the fan-out or kill the worker
+            try:
+                self.onError(observer, notificationData, error)
+            except Exception:
+                with self.errorLock:
+                    self.failedHandlers += 1
+
+    def join(self):
+        # Waits until every queued notification has been delivered
+        self.queue.join()
+
+    def close(self):
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+class ObserverRegistry(object):
+    """
+       Observers kept in insertion order with O(1) add and remove. They live in
+       a plain list so a snapshot is a cheap copy, removed observers leave a
+       None behind which is compacted away once there are enough of them. With
+       weak set to True only weak references are held, and observers that have
+       been garbage collected drop out of the registry by themselves.
+    """
+    def __init__(self, weak=False):
+        self.weak = weak
+        self.slots = []
+        self.keys = []
+        self.indexes = {}
+        self.tombstones = 0
+
+    def add(self, observer):
+        key = id(observer)
+        if self.weak:
+            def collected(reference):
+                index = self.indexes.get(key)
+                if index is not None and self.slots[index] is reference:
+                    self.removeKey(key)
+            entry = weakref.ref(observer, collected)
+        else:
+            entry = observer
+        index = self.indexes.get(key)
+        if index is not None:
+            self.slots[index] = entry
+            return
+        self.indexes[key] = len(self.slots)
+        self.slots.append(entry)
+        self.keys.append(key)
+
+    def remove(self, observer):
+        if id(observer) not in self.indexes:
+            raise ValueError("Observer is not registered")
+        self.removeKey(id(observer))
+
+    def removeKey(self, key):
+        index = self.indexes.pop(key)
+        self.slots[index] = None
+        self.keys[index] = None
+        self.tombstones += 1
+        if self.tombstones > 32 and self.tombstones * 2 > len(self.slots):
+            self.compact()
+
+    def compact(self):
+        self.slots = [entry for entry in self.slots if entry is not None]
+        self.keys = [key for key in self.keys if key is not None]
+        self.indexes = dict((key, index) for index, key in enumerate(self.keys))
+        self.tombstones = 0
+
+    def snapshot(self):
+        # Raw entries, None for removed observers and weak references in weak mode
+        return tuple(self.slots)
+
+    def resolve(self, entry):
+        if entry is None or not self.weak:
+            return entry
+        return entry()
+
+    def __contains__(self, observer):
+        return id(observer) in self.indexes
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __iter__(self):
+        # Iterates over a snapshot so observers can unsubscribe while being notified
+        for entry in self.snapshot():
+            observer = self.resolve(entry)
+            if observer is not None:
+                yield observer
+
 class Subject(object):
-    def __init__(self, name):
-        self.observers = []
-        self.name = name
+    def __init__(self, name, dispatcher=None, weakObservers=False):
+        self.observers = ObserverRegistry(weakObservers)
+        # Only byte strings can be interned on Python 2, other names are kept as they are
+        self.name = intern(name) if type(name) is str else name
+        self.dispatcher = dispatcher
 
     def addObserver(self, observer):
-        self.observers.append(observer)
+        self.observers.add(observer)
 
     def removeObserver(self, observer):
         self.observers.remove(observer)
 
     def notifyObservers(self, notificationData):
+        if self.dispatcher:
+            self.dispatcher.dispatch(self.observers, notificationData)
+            return
         for observer in self.observers:
             observer.update(notificationData)
 
@@ -55,8 +236,8 @@ class NewPost(NotificationData):
             return false
 
 class User(Subject):
-    def __init__(self, name):
-        Subject.__init__(self, name)
+    def __init__(self, name, dispatcher=None):
+        Subject.__init__(self, name, dispatcher)
 
     def createPost(self, url, description):
         data = {
@@ -67,6 +248,9 @@ class User(Subject):
         newPost = NewPost(data).data
         self.notifyObservers(newPost)
 
+    def publishPost(self, url, description):
+        self.notifyObservers(PostRecord(self.name, url, description))
+
 class Follower(Observer):
     def __init__(self, name):
         self.name = name
@@ -90,32 +274,128 @@ class Follower(Observer):
         print self.name + ": " + str(self.newPosts)
         self.seen()
 
-# Initiate a really popular woman
-chloe = User("Chloe")
+class TimelineUser(User):
+    """
+       Fan-out on read - every post is written once to this user's append-only
+       timeline and only online followers are notified straight away. Offline
+       followers keep a cursor into the timeline and read the posts they missed
+       when they come back online. Works with TimelineFollower observers.
+    """
+    sequence = itertools.count()
+
+    def __init__(self, name, dispatcher=None):
+        User.__init__(self, name, dispatcher)
+        self.timeline = []
+        self.onlineObservers = ObserverRegistry()
+
+    def addObserver(self, observer):
+        User.addObserver(self, observer)
+        observer.follow(self)
+        if observer.isOnline:
+            self.onlineObservers.add(observer)
+
+    def removeObserver(self, observer):
+        User.removeObserver(self, observer)
+        observer.unfollow(self)
+        if observer in self.onlineObservers:
+            self.onlineObservers.remove(observer)
+
+    def observerOnline(self, observer, isOnline):
+        if isOnline and observer not in self.onlineObservers:
+            self.onlineObservers.add(observer)
+        elif not isOnline and observer in self.onlineObservers:
+            self.onlineObservers.remove(observer)
+
+    def notifyObservers(self, notificationData):
+        self.timeline.append((next(self.sequence), notificationData))
+        if self.dispatcher:
+            self.dispatcher.dispatch(self.onlineObservers, notificationData)
+            return
+        for observer in self.onlineObservers:
+            observer.update(notificationData)
+
+class TimelineFollower(Follower):
+    def __init__(self, name):
+        Follower.__init__(self, name)
+        # Position in each followed user's timeline up to which posts were seen
+        self.cursors = {}
+
+    def follow(self, subject):
+        self.cursors[subject] = len(subject.timeline)
+
+    def unfollow(self, subject):
+        del self.cursors[subject]
+
+    def unseenPosts(self, subject):
+        timeline = subject.timeline
+        for i in xrange(self.cursors[subject], len(timeline)):
+            yield timeline[i]
+
+    def pendingPosts(self):
+        # Merges the unseen part of every followed timeline in posting order
+        slices = [self.unseenPosts(subject) for subject in self.cursors]
+        return (data for sequence, data in heapq.merge(*slices))
+
+    def setOnline(self, b):
+        if b:
+            self.newPosts.extend(self.pendingPosts())
+        for subject in self.cursors:
+            subject.observerOnline(self, b)
+            self.cursors[subject] = len(subject.timeline)
+        Follower.setOnline(self, b)
+
+if __name__ == "__main__":
+    # Initiate a really popular woman
+    chloe = User("Chloe")
+
+    # Initiate the Followers
+    tom = Follower("Tom")
+    jack = Follower("Jack")
+
+    # Let the guys follow Chloe
+    chloe.addObserver(tom)
+    chloe.addObserver(jack)
+
+    # Let guy1 be offline while guy2 be online, guy2 will only receive the instant notifications
+    jack.setOnline(True)
 
-# Initiate the Followers
-tom = Follower("Tom")
-jack = Follower("Jack")
+    # Pretty woman creates post and only guy2 will receive the updates
+    print "Jack receiving the new post only"
+    chloe.createPost("http://www.selfiemine.com/selfie1.png", "Selfie taken at home")
+    print "Jack receives another post"
+    chloe.createPost("http://www.modelshoot.com/chloe.png", "Model shoot")
 
-# Let the guys follow Chloe
-chloe.addObserver(tom)
-chloe.addObserver(jack)
+    print "Now Tom goes online and receives updates"
+    tom.setOnline(True)
 
-# Let guy1 be offline while guy2 be online, guy2 will only receive the instant notifications
-jack.setOnline(True)
+    print "Now Chloe creates another post and both guys receive it"
+    chloe.createPost("http://www.ootd.com/ootd.png", "#ootd")
 
-# Pretty woman creates post and only guy2 will receive the updates
-print "Jack receiving the new post only"
-chloe.createPost("http://www.selfiemine.com/selfie1.png", "Selfie taken at home")
-print "Jack receives another post"
-chloe.createPost("http://www.modelshoot.com/chloe.png", "Model shoot")
+    print "Chloe finds Tom creepy, removes him, then creates another new post"
+    chloe.removeObserver(tom)
+    chloe.createPost("http://www.ootd2.com/ootd2.png", "#ootd")
 
-print "Now Tom goes online and receives updates"
-tom.setOnline(True)
+    print "A celebrity posts through a dispatcher and does not wait for her followers"
+    dispatcher = NotificationDispatcher(chunkSize=2)
+    celebrity = User("Celebrity", dispatcher)
+    fans = [Follower("Fan %d" % i) for i in range(5)]
+    for fan in fans:
+        celebrity.addObserver(fan)
+    celebrity.createPost("http://www.redcarpet.com/premiere.png", "Premiere night")
+    dispatcher.join()
+    fans[0].setOnline(True)
+    dispatcher.close()
 
-print "Now Chloe creates another post and both guys receive it"
-chloe.createPost("http://www.ootd.com/ootd.png", "#ootd")
+    print "Chloe and the celebrity write to their timelines, Tom reads them when he is back"
+    chloe = TimelineUser("Chloe")
+    celebrity = TimelineUser("Celebrity")
+    tom = TimelineFollower("Tom")
+    chloe.addObserver(tom)
+    celebrity.addObserver(tom)
+    chloe.createPost("http://www.selfiemine.com/selfie2.png", "Another selfie")
+    celebrity.createPost("http://www.redcarpet.com/afterparty.png", "After party")
+    tom.setOnline(True)
+    chloe.createPost("http://www.ootd.com/ootd3.png", "#ootd")
 
-print "Chloe finds Tom creepy, removes him, then creates another new post"
-chloe.removeObserver(tom)
-chloe.createPost("http://www.ootd2.com/ootd2.png", "#ootd")
+    print "Posts can also be published as compact records shared by all followers"
+    chloe.publishPost("http://www.ootd.com/ootd4.png", "#ootd again")
@@ -8,7 +8,106 @@
    the different type of users
 """
 
+import itertools, timeit
+from array import array
+from collections import namedtuple
+
 class UserFactory(object):
+    # locale -> User class, new locales can be registered at runtime
+    registry = {}
+
+    @classmethod
+    def registerLocale(cls, locale, userClass):
+        cls.registry[locale] = userClass
+
+    def createUser(self, locale):
+        userClass = self.registry.get(locale)
+        if userClass is None:
+            print "Please specify a locale"
+            return
+        return userClass()
+
+    def createUsers(self, locales, batchSize=10000, columnar=False):
+        """
+           Creates one user per locale in locales, which can be any iterable and
+           is read batchSize items at a time. Each batch is grouped by locale so
+           every locale is dispatched once per batch. Yields the users in input
+           order, None for an unknown locale. With columnar set, returns a
+           UserColumns holding one locale id per user instead.
+        """
+        batches = self.createBatches(locales, batchSize)
+        if columnar:
+            columns = UserColumns()
+            for batch in batches:
+                columns.extend(batch)
+            return columns
+        return (user for batch in batches for user in self.buildBatch(batch))
+
+    def createBatches(self, locales, batchSize):
+        locales = iter(locales)
+        while True:
+            batch = list(itertools.islice(locales, batchSize))
+            if not batch:
+                return
+            yield batch
+
+    def buildBatch(self, batch):
+        groups = {}
+        for position, locale in enumerate(batch):
+            groups.setdefault(locale, []).append(position)
+        users = [None] * len(batch)
+        for locale, positions in groups.items():
+            userClass = self.registry.get(locale)
+            if userClass is None:
+                continue
+            for position, user in zip(positions, userClass.createMany(len(positions))):
+                users[position] = user
+        return users
+
+class UserColumns(object):
+    """
+       Columnar result of a bulk creation, an array of locale ids with a table
+       of locales and their shared profiles. Id 0 marks an unknown locale. The
+       ids start as bytes and the array is widened when more locales show up.
+    """
+    UNKNOWN = 0
+    WIDER = {"B": "H", "H": "I"}
+
+    def __init__(self):
+        self.localeIds = array("B")
+        self.locales = [None]
+        self.profiles = [None]
+        self.localeTable = {}
+
+    def localeId(self, locale):
+        localeId = self.localeTable.get(locale)
+        if localeId is None:
+            userClass = UserFactory.registry.get(locale)
+            if userClass is None:
+                return self.UNKNOWN
+            localeId = self.localeTable[locale] = len(self.locales)
+            self.locales.append(locale)
+            self.profiles.append(userClass().profile)
+            if localeId >= 1 << (8 * self.localeIds.itemsize):
+                self.localeIds = array(self.WIDER[self.localeIds.typecode], self.localeIds)
+        return localeId
+
+    def extend(self, locales):
+        # Ids are worked out first as a new locale may widen the array
+        localeIds = [self.localeId(locale) for locale in locales]
+        self.localeIds.extend(localeIds)
+
+    def __len__(self):
+        return len(self.localeIds)
+
+    def getProfile(self, index):
+        profile = self.profiles[self.localeIds[index]]
+        if profile is None:
+            return None
+        return dict(profile._asdict())
+
+class ChainedUserFactory(object):
+    # The original if/elif factory, kept to compare against the registry
     def createUser(self, locale):
         if locale == "us":
             return AmericanUser()
@@ -22,10 +121,41 @@ class UserFactory(object):
             print "Please specify a locale"
             return
 
+class UserProfile(namedtuple("UserProfile", ["language", "currency"])):
+    """
+       Immutable language and currency pair, shared by every user with the
+       same profile instead of each user keeping its own strings.
+    """
+    __slots__ = ()
+    profiles = {}
+
+    @classmethod
+    def get(cls, language, currency):
+        key = (language, currency)
+        profile = cls.profiles.get(key)
+        if profile is None:
+            profile = cls.profiles[key] = cls(language, currency)
+        return profile
+
 class User(object):
+    __slots__ = ["profile"]
+
     def __init__(self, language, currency):
-        self.language = language
-        self.currency = currency
+        self.profile = UserProfile.get(language, currency)
+
+    @classmethod
+    def createMany(cls, count):
+        # Every user runs __init__, the profiles are shared through UserProfile.get.
+        # Subclasses that can build a batch faster override this
+        return [cls() for i in xrange(count)]
+
+    @property
+    def language(self):
+        return self.profile.language
+
+    @property
+    def currency(self):
+        return self.profile.currency
 
     def getProfile(self):
         return {
@@ -34,21 +164,56 @@ class User(object):
         }
 
 class AmericanUser(User):
+    __slots__ = []
+
     def __init__(self):
         super(AmericanUser, self).__init__("English", "USD")
 
 class ChineseUser(User):
+    __slots__ = []
+
     def __init__(self):
         super(ChineseUser, self).__init__("Chinese", "RMB")
 
 class BritishUser(User):
+    __slots__ = []
+
     def __init__(self):
         super(BritishUser, self).__init__("English", "GBP")
 
 class JapaneseUser(User):
+    __slots__ = []
+
     def __init__(self):
         super(JapaneseUser, self).__init__("Japanese", "JPY")
 
-userFactory = UserFactory()
-americanUser = userFactory.createUser("us")
-print americanUser.getProfile()
+UserFactory.registerLocale("us", AmericanUser)
+UserFactory.registerLocale("china", ChineseUser)
+UserFactory.registerLocale("uk", BritishUser)
+UserFactory.registerLocale("japan", JapaneseUser)
+
+def benchmarkFactories(userCount):
+    locales = ["us", "china", "uk", "japan"]
+    requests = [locales[i % len(locales)] for i in range(userCount)]
+    results = []
+    for factory in [ChainedUserFactory(), UserFactory()]:
+        createUser = factory.createUser
+        timeBefore = timeit.default_timer()
+        for locale in requests:
+            createUser(locale)
+        results.append((timeit.default_timer() - timeBefore) * 1000)
+    return results
+
+if __name__ == "__main__":
+    userFactory = UserFactory()
+    americanUser = userFactory.createUser("us")
+    print americanUser.getProfile()
+
+    signups = ["us", "japan", "uk", "us", "mars", "china"]
+    print [user.getProfile() if user else None for user in userFactory.createUsers(signups)]
+    columns = userFactory.createUsers(signups, columnar=True)
+    print list(columns.localeIds), columns.getProfile(1)
+
+    chainTime, registryTime = benchmarkFactories(200000)
+    print "Time Taken (if/elif chain): %dms" % chainTime
+    print "Time Taken (locale registry): %dms" % registryTime
@@ -24,7 +24,8 @@ class ConfigModule(Singleton):
     def someReallyUsefulFunction(self):
         print "Hello World"
 
-instance1 = ConfigModule()
-instance2 = ConfigModule()
+if __name__ == "__main__":
+    instance1 = ConfigModule()
+    instance2 = ConfigModule()
 
-assert instance1 is instance2
+    assert instance1 is instance2
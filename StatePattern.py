@@ -9,71 +9,174 @@
    to fit its use case.
 """
 
-class CandyDispenser:
-	def __init__(self):
-		self.hasCoin = HasCoin(self)
-		self.noCoin = NoCoin(self)
-		self.hasCandy = HasCandy(self)
-		self.noCandy = NoCandy(self)
-		self.state = self.noCoin
-		self.candyCount = 1
-
-	def getHasCoin(self):
-		return self.hasCoin
+import functools, random, timeit
+from array import array
+from collections import deque, namedtuple
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+class PrintSink:
+	"""
+	   Sinks receive what the dispenser has to say as it is said, and a record of
+	   every transition with the messages said during it. Seconds is the time
+	   spent in the transition itself, not counting the transitions it triggered.
+	   This one prints the messages, the same as the dispenser always did.
+	   Sinks that don't set recordsTransitions are never sent transitions, so the
+	   dispenser doesn't time them.
+	"""
+	recordsTransitions = False
+
+	def message(self, text):
+		print text
+
+	def transition(self, fromState, event, toState, seconds, messages):
+		pass
+
+class NullSink:
+	recordsTransitions = False
+
+	def message(self, text):
+		pass
+
+	def transition(self, fromState, event, toState, seconds, messages):
+		pass
+
+class CounterSink(NullSink):
+	"""
+	   Counts every (state, event, next state) transition and the time spent in it.
+	"""
+	recordsTransitions = True
 
-	def getNoCoin(self):
-		return self.noCoin
-
-	def getHasCandy(self):
-		return self.hasCandy
+	def __init__(self):
+		self.counts = {}
+		self.seconds = {}
+
+	def transition(self, fromState, event, toState, seconds, messages):
+		key = (fromState, event, toState)
+		self.counts[key] = self.counts.get(key, 0) + 1
+		self.seconds[key] = self.seconds.get(key, 0.0) + seconds
+
+	def getStats(self):
+		return dict((key, {
+			"count": count,
+			"averageSeconds": self.seconds[key] / count
+		}) for key, count in self.counts.items())
+
+TransitionEvent = namedtuple('TransitionEvent', ['fromState', 'event', 'toState', 'seconds', 'messages'])
+
+class RingBufferSink(CounterSink):
+	"""
+	   Keeps the last capacity transitions, with the messages said during each one.
+	"""
+	def __init__(self, capacity=1000):
+		CounterSink.__init__(self)
+		self.events = deque(maxlen=capacity)
+
+	def transition(self, fromState, event, toState, seconds, messages):
+		CounterSink.transition(self, fromState, event, toState, seconds, messages)
+		self.events.append(TransitionEvent(fromState, event, toState, seconds, messages))
+
+def stateMachine(cls):
+	"""
+	   Class decorator that builds the (state, event) -> handler table of a state
+	   machine once, when the class is created, and adds a method for every event
+	   the class doesn't define itself. State machines stay classic classes, whose
+	   attribute lookups are the cheapest in Python 2.
+	"""
+	cls.dispatchTable = {}
+	for stateName, stateClass in cls.states:
+		for event in cls.events:
+			cls.dispatchTable[stateName, event] = getattr(stateClass, event).im_func
+	for event in cls.events:
+		if event not in cls.__dict__:
+			setattr(cls, event, eventMethod(event))
+	return cls
+
+def eventMethod(event):
+	def handleEvent(self):
+		self.stateHandlers[event]()
+	handleEvent.__name__ = event
+	return handleEvent
+
+class StateMachine:
+	"""
+	   Base for state machines whose states are State objects. Subclasses list
+	   their states as (attribute name, State class) pairs and their events, and
+	   are decorated with stateMachine.
+	   Every instance binds the class table to its own state objects, each state
+	   keeps its row and the machine keeps the row of the current state at hand,
+	   so firing an event is a single dictionary lookup. Events only go through
+	   handle when the machine is instrumented.
+	"""
+	states = []
+	events = []
+	instrumented = False
 
-	def getNoCandy(self):
-		return self.noCandy
+	def __init__(self):
+		for stateName, stateClass in self.states:
+			state = stateClass(self)
+			setattr(self, stateName, state)
+			state.handlers = dict((event, self.dispatchTable[stateName, event].__get__(state, stateClass))
+				for event in self.events)
+		self.state = None
+		self.stateHandlers = {}
 
 	def setState(self, state):
+		# Picks the state's row of the table once per transition rather than once per event
 		self.state = state
+		self.stateHandlers = state.handlers
 
-	def dispense(self):
-		self.state.dispense()
+	def setInstrumented(self, instrumented):
+		# Events fire straight from the table, instrumented machines route their own
+		# events through handle instead
+		self.instrumented = instrumented
+		for event in self.events:
+			if instrumented:
+				setattr(self, event, functools.partial(self.handle, event))
+			else:
+				self.__dict__.pop(event, None)
 
-	def insertCoin(self):
-		self.state.insertCoin()
+	def fire(self, event):
+		self.stateHandlers[event]()
 
-	def ejectCoin(self):
-		self.state.ejectCoin()
-
-	def turnKnob(self):
-		self.state.turnKnob()
+	def handle(self, event):
+		self.fire(event)
 
 class State:
 	def __init__(self, dispenser):
 		self.dispenser = dispenser
 
+	def say(self, text):
+		self.dispenser.say(text)
+
 	def dispense(self):
-		print "You need to implement this method"
+		self.say("You need to implement this method")
 
 	def insertCoin(self):
-		print "You need to implement this method"
+		self.say("You need to implement this method")
 
 	def ejectCoin(self):
-		print "You need to implement this method"
+		self.say("You need to implement this method")
 
 	def turnKnob(self):
-		print "You need to implement this method"
+		self.say("You need to implement this method")
 
 class HasCoin(State):
 	def dispense(self):
-		print "Nothing happens"
+		self.say("Nothing happens")
 
 	def insertCoin(self):
-		print "You have already got a coin inside"
+		self.say("You have already got a coin inside")
 
 	def ejectCoin(self):
-		print "The machine returns you back your coin"
+		self.say("The machine returns you back your coin")
 		self.dispenser.setState(self.dispenser.getNoCoin())
 
 	def turnKnob(self):
-		print "Checking whether the machine is left with candies"
+		self.say("Checking whether the machine is left with candies")
 		if self.dispenser.candyCount > 0:
 			self.dispenser.setState(self.dispenser.getHasCandy())
 		else:
@@ -82,55 +185,317 @@ class HasCoin(State):
 
 class NoCoin(State):
 	def dispense(self):
-		print "Nothing happens"
+		self.say("Nothing happens")
 
 	def insertCoin(self):
-		print "You inserted a coin"
+		self.say("You inserted a coin")
 		self.dispenser.setState(self.dispenser.getHasCoin())
 
 	def ejectCoin(self):
-		print "There is no coin for you to eject"
+		self.say("There is no coin for you to eject")
 
 	def turnKnob(self):
-		print "Please don't try to cheat the system"
+		self.say("Please don't try to cheat the system")
 
 class HasCandy(State):
 	def dispense(self):
-		print "One candy drop out"
+		self.say("One candy drop out")
 		self.dispenser.candyCount = self.dispenser.candyCount - 1
-		print "Candies left: %d" % self.dispenser.candyCount
+		self.say("Candies left: %d" % self.dispenser.candyCount)
 		self.dispenser.setState(self.dispenser.getNoCoin())
 
 	def insertCoin(self):
-		print "Eating your coin, please wait"
+		self.say("Eating your coin, please wait")
 
 	def ejectCoin(self):
-		print "Sorry too late, eating your coin now"
+		self.say("Sorry too late, eating your coin now")
 
 	def turnKnob(self):
-		print "You can't dispense twice!"
+		self.say("You can't dispense twice!")
 
 class NoCandy(State):
 	def dispense(self):
-		print "No more candy left, sorry"
+		self.say("No more candy left, sorry")
 		self.dispenser.setState(self.dispenser.getHasCoin())
 
 	def insertCoin(self):
-		print "Your coin is still inside"
+		self.say("Your coin is still inside")
 
 	def ejectCoin(self):
-		print "The machine returns you back your coin"
+		self.say("The machine returns you back your coin")
 		self.dispenser.setState(self.dispenser.getNoCoin())
 
 	def turnKnob(self):
-		print "You can't turn the knob yet!"
+		self.say("You can't turn the knob yet!")
+
+STATES = ['noCoin', 'hasCoin', 'hasCandy', 'noCandy']
+EVENTS = ['insertCoin', 'ejectCoin', 'turnKnob', 'dispense']
+
+class Transition:
+	"""
+	   A transition in progress. Its next state is the state it reached before
+	   firing a nested event, or the final state if it fired none.
+	"""
+	def __init__(self, fromState):
+		self.fromState = fromState
+		self.toState = None
+		self.messages = []
+		self.nestedSeconds = 0.0
+
+	def enterNested(self, state):
+		if self.toState is None:
+			self.toState = state
+
+@stateMachine
+class CandyDispenser(StateMachine):
+	"""
+	   The public events call the current state directly, which is as cheap as
+	   dispatching gets in Python. The table serves fire, for events known by name.
+	"""
+	states = zip(STATES, [NoCoin, HasCoin, HasCandy, NoCandy])
+	events = EVENTS
+
+	def __init__(self, sink=None):
+		StateMachine.__init__(self)
+		self.transitions = []
+		self.setSink(sink or PrintSink())
+		self.setState(self.noCoin)
+		self.candyCount = 1
+
+	def getHasCoin(self):
+		return self.hasCoin
+
+	def getNoCoin(self):
+		return self.noCoin
+
+	def getHasCandy(self):
+		return self.hasCandy
+
+	def getNoCandy(self):
+		return self.noCandy
+
+	def dispense(self):
+		self.state.dispense()
 
-candyDispenser = CandyDispenser()
+	def insertCoin(self):
+		self.state.insertCoin()
+
+	def ejectCoin(self):
+		self.state.ejectCoin()
+
+	def turnKnob(self):
+		self.state.turnKnob()
+
+	def setSink(self, sink):
+		# Only sinks that record transitions pay for timing them, the others get
+		# the messages straight from the states
+		self.sink = sink
+		self.setInstrumented(getattr(sink, "recordsTransitions", True))
+		if self.instrumented:
+			say = self.recordMessage
+		else:
+			say = sink.message
+		self.say = say
+		for stateName, stateClass in self.states:
+			getattr(self, stateName).say = say
+
+	def recordMessage(self, text):
+		self.sink.message(text)
+		if self.transitions:
+			self.transitions[-1].messages.append(text)
+
+	def handle(self, event):
+		# A handler can fire another event (turnKnob dispenses), transitions are
+		# stacked so each one keeps its own messages, next state and self time
+		if self.transitions:
+			self.transitions[-1].enterNested(self.state)
+		transition = Transition(self.state)
+		self.transitions.append(transition)
+		timeBefore = timeit.default_timer()
+		try:
+			self.stateHandlers[event]()
+		finally:
+			seconds = timeit.default_timer() - timeBefore
+			self.transitions.pop()
+			if self.transitions:
+				self.transitions[-1].nestedSeconds += seconds
+		toState = transition.toState or self.state
+		self.sink.transition(transition.fromState.__class__.__name__, event, toState.__class__.__name__,
+			seconds - transition.nestedSeconds, tuple(transition.messages))
+
+def compileTransitions():
+	"""
+	   Builds the transition tables by replaying every event on a CandyDispenser
+	   in every state, with and without candies left. nextState[event][state][hasCandy]
+	   is the id of the resulting state and candyUsed[event][state][hasCandy] the
+	   number of candies dispensed, so the tables always agree with the state objects.
+	"""
+	nextState = []
+	candyUsed = []
+	for event in EVENTS:
+		nextStateRow = []
+		candyUsedRow = []
+		for state in STATES:
+			nextStates = []
+			candies = []
+			for hasCandy in [0, 1]:
+				dispenser = CandyDispenser(NullSink())
+				dispenser.candyCount = hasCandy
+				dispenser.setState(getattr(dispenser, state))
+				getattr(dispenser, event)()
+				nextStates.append(STATES.index([name for name in STATES if getattr(dispenser, name) is dispenser.state][0]))
+				candies.append(hasCandy - dispenser.candyCount)
+			nextStateRow.append(nextStates)
+			candyUsedRow.append(candies)
+		nextState.append(nextStateRow)
+		candyUsed.append(candyUsedRow)
+	return nextState, candyUsed
+
+class CandyDispenserFleet:
+	"""
+	   Simulates many candy dispensers at once. The state id and the candy count
+	   of every machine are kept in arrays and each step applies one event per
+	   machine through the compiled transition tables. With NumPy a step is a
+	   single vectorized lookup, otherwise it falls back to a loop over the tables.
+	"""
+	def __init__(self, machineCount, candyCount=1):
+		nextState, candyUsed = compileTransitions()
+		if numpy is not None:
+			self.nextState = numpy.array(nextState, dtype=numpy.uint8)
+			self.candyUsed = numpy.array(candyUsed, dtype=numpy.int64)
+			self.states = numpy.zeros(machineCount, dtype=numpy.uint8)
+			self.candyCounts = numpy.full(machineCount, candyCount, dtype=numpy.int64)
+		else:
+			self.nextState = nextState
+			self.candyUsed = candyUsed
+			self.states = array('B', [0] * machineCount)
+			self.candyCounts = array('l', [candyCount] * machineCount)
+
+	def step(self, events):
+		# events holds one event id for every machine
+		if numpy is not None:
+			events = numpy.asarray(events)
+			hasCandy = (self.candyCounts > 0).astype(numpy.uint8)
+			self.candyCounts -= self.candyUsed[events, self.states, hasCandy]
+			self.states = self.nextState[events, self.states, hasCandy]
+			return
+		nextState = self.nextState
+		candyUsed = self.candyUsed
+		states = self.states
+		candyCounts = self.candyCounts
+		for machine, event in enumerate(events):
+			state = states[machine]
+			hasCandy = 1 if candyCounts[machine] > 0 else 0
+			candyCounts[machine] -= candyUsed[event][state][hasCandy]
+			states[machine] = nextState[event][state][hasCandy]
+
+	def run(self, eventLog):
+		for events in eventLog:
+			self.step(events)
+
+	def getState(self, machine):
+		return STATES[self.states[machine]]
+
+class ObjectDispatchDispenser:
+	"""
+	   The dispenser as it was before the dispatch table, every event looks its
+	   method up on the current state. It shares the state classes with
+	   CandyDispenser so benchmarkDispatch only measures the dispatching.
+	"""
+	def __init__(self, sink):
+		self.hasCoin = HasCoin(self)
+		self.noCoin = NoCoin(self)
+		self.hasCandy = HasCandy(self)
+		self.noCandy = NoCandy(self)
+		for state in [self.hasCoin, self.noCoin, self.hasCandy, self.noCandy]:
+			state.say = sink.message
+		self.say = sink.message
+		self.state = self.noCoin
+		self.candyCount = 1
+
+	def getHasCoin(self):
+		return self.hasCoin
+
+	def getNoCoin(self):
+		return self.noCoin
+
+	def getHasCandy(self):
+		return self.hasCandy
+
+	def getNoCandy(self):
+		return self.noCandy
+
+	def setState(self, state):
+		self.state = state
+
+	def dispense(self):
+		self.state.dispense()
+
+	def insertCoin(self):
+		self.state.insertCoin()
+
+	def ejectCoin(self):
+		self.state.ejectCoin()
+
+	def turnKnob(self):
+		self.state.turnKnob()
 
-candyDispenser.insertCoin()
-candyDispenser.insertCoin()
-candyDispenser.turnKnob()
-candyDispenser.ejectCoin()
-candyDispenser.insertCoin()
-candyDispenser.turnKnob()
-candyDispenser.ejectCoin()
\ No newline at end of file
+def driveDispenser(dispenser, cycleCount):
+	dispenser.candyCount = cycleCount
+	insertCoin, turnKnob, ejectCoin = dispenser.insertCoin, dispenser.turnKnob, dispenser.ejectCoin
+	timeBefore = timeit.default_timer()
+	for i in xrange(cycleCount):
+		insertCoin()
+		turnKnob()
+		ejectCoin()
+	return (timeit.default_timer() - timeBefore) * 1000
+
+def benchmarkDispatch(cycleCount, repeat=5):
+	"""
+	   Times cycleCount insertCoin, turnKnob and ejectCoin calls through the public
+	   event methods of both dispensers. Both are silent so only the dispatching
+	   differs, and the best of repeat runs is kept.
+	"""
+	objectTime = min(driveDispenser(ObjectDispatchDispenser(NullSink()), cycleCount) for i in range(repeat))
+	tableTime = min(driveDispenser(CandyDispenser(NullSink()), cycleCount) for i in range(repeat))
+	return objectTime, tableTime
+
+if __name__ == "__main__":
+	candyDispenser = CandyDispenser()
+
+	candyDispenser.insertCoin()
+	candyDispenser.insertCoin()
+	candyDispenser.turnKnob()
+	candyDispenser.ejectCoin()
+	candyDispenser.insertCoin()
+	candyDispenser.turnKnob()
+	candyDispenser.ejectCoin()
+
+	print "Simulating a fleet of dispensers and checking it against the state objects"
+	machineCount = 100
+	eventLog = [[random.randrange(len(EVENTS)) for machine in range(machineCount)] for step in range(50)]
+	fleet = CandyDispenserFleet(machineCount, 3)
+	fleet.run(eventLog)
+	dispensers = [CandyDispenser(NullSink()) for machine in range(machineCount)]
+	for dispenser in dispensers:
+		dispenser.candyCount = 3
+	for events in eventLog:
+		for dispenser, event in zip(dispensers, events):
+			getattr(dispenser, EVENTS[event])()
+	print "Fleet matches the state objects: %s" % all(
+		getattr(dispenser, fleet.getState(machine)) is dispenser.state and dispenser.candyCount == fleet.candyCounts[machine]
+		for machine, dispenser in enumerate(dispensers))
+
+	print "Profiling a silent dispenser"
+	counters = CounterSink()
+	silentDispenser = CandyDispenser(counters)
+	silentDispenser.candyCount = 1000
+	for i in range(1000):
+		silentDispenser.insertCoin()
+		silentDispenser.turnKnob()
+	for transition, stats in sorted(counters.getStats().items()):
+		print "%s -> %s -> %s: %d times" % (transition + (stats["count"],))
+
+	objectTime, tableTime = benchmarkDispatch(100000)
+	print "Time Taken (Object dispatch dispenser): %dms" % objectTime
+	print "Time Taken (CandyDispenser): %dms" % tableTime
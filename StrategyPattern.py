@@ -49,16 +49,17 @@ class User(object):
     def performLogin(self):
         self.loginMethod.login()
 
-# This user has no login method defined
-user1 = User()
-user1.performLogin()
+if __name__ == "__main__":
+    # This user has no login method defined
+    user1 = User()
+    user1.performLogin()
 
-# This user uses Facebook
-user2 = User()
-user2.setLoginMethod(FacebookLogin())
-user2.performLogin()
+    # This user uses Facebook
+    user2 = User()
+    user2.setLoginMethod(FacebookLogin())
+    user2.performLogin()
 
-# This user uses Google
-user3 = User()
-user3.setLoginMethod(GoogleLogin())
-user3.performLogin()
+    # This user uses Google
+    user3 = User()
+    user3.setLoginMethod(GoogleLogin())
+    user3.performLogin()
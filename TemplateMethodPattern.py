@@ -41,16 +41,17 @@ class Coffee(CaffeineBeverage):
 	def addCondiments(self):
 		print "Adding sugar and milk into the cup"
 
-print "----- Tea -----"
-tea = Tea()
-tea.boilWater()
-tea.brew()
-tea.pourIntoCup()
-tea.addCondiments()
-
-print "----- Coffee -----"
-coffee = Coffee()
-coffee.boilWater()
-coffee.brew()
-coffee.pourIntoCup()
-coffee.addCondiments()
\ No newline at end of file
+if __name__ == "__main__":
+	print "----- Tea -----"
+	tea = Tea()
+	tea.boilWater()
+	tea.brew()
+	tea.pourIntoCup()
+	tea.addCondiments()
+
+	print "----- Coffee -----"
+	coffee = Coffee()
+	coffee.boilWater()
+	coffee.brew()
+	coffee.pourIntoCup()
+	coffee.addCondiments()
@@ -0,0 +1,69 @@
+"""
+   Design Patterns - gives access to every pattern module of this repository
+   without loading them up front. Importing the package imports none of the
+   patterns, each module is only imported the first time it is used, e.g.
+
+       import designpatterns
+       tree = designpatterns.FlyWeightPattern.ChristmasTree()
+
+   The demos of the modules only run when a module is executed as a script.
+"""
+
+import importlib
+import sys
+import types
+
+PATTERNS = [
+    "AbstractFactoryPattern",
+    "AdapterPattern",
+    "BridgePattern",
+    "BuilderPattern",
+    "CommandPattern",
+    "CompositePattern",
+    "DecoratorPattern",
+    "FacadePattern",
+    "FactoryMethodPattern",
+    "FlyWeightPattern",
+    "IteratorPattern",
+    "ModelViewControllerPattern",
+    "ObserverPattern",
+    "SimpleFactoryPattern",
+    "SingletonPattern",
+    "StatePattern",
+    "StrategyPattern",
+    "TemplateMethodPattern"
+]
+
+__all__ = list(PATTERNS)
+
+def __getattr__(name):
+    # Module level __getattr__ (PEP 562), only called when name is not loaded yet
+    if name not in PATTERNS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    module = importlib.import_module(name)
+    setattr(sys.modules[__name__], name, module)
+    return module
+
+def __dir__():
+    return sorted(set(list(globals().keys()) + PATTERNS))
+
+class LazyModule(types.ModuleType):
+    """
+       Stand-in for PEP 562 before Python 3.7, the package replaces itself in
+       sys.modules with this module, which forwards unknown attributes to the
+       package's __getattr__.
+    """
+    def __init__(self, module):
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # Python 2 clears the globals of a module once it is garbage collected
+        self.originalModule = module
+
+    def __getattr__(self, name):
+        return __getattr__(name)
+
+    def __dir__(self):
+        return __dir__()
+
+if sys.version_info < (3, 7):
+    sys.modules[__name__] = LazyModule(sys.modules[__name__])
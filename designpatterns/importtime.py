@@ -0,0 +1,57 @@
+"""
+   Import time benchmark - imports every pattern module in a fresh interpreter
+   and reports how long it took, then compares importing the package and
+   using one pattern through it against importing every pattern eagerly.
+
+       python -m designpatterns.importtime
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from designpatterns import PATTERNS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMER = (
+    "import sys, timeit\n"
+    "timeBefore = timeit.default_timer()\n"
+    "%s\n"
+    "timeTaken = (timeit.default_timer() - timeBefore) * 1000\n"
+    "sys.stdout.write('%%f %%d' %% (timeTaken, len(sys.modules)))\n"
+)
+
+def timeImport(statement, repeat=5):
+    """
+       Runs statement in a fresh interpreter repeat times and returns the best
+       time in milliseconds and the number of modules loaded afterwards.
+    """
+    best = None
+    for i in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", TIMER % statement], cwd=ROOT)
+        timeTaken, moduleCount = output.split()
+        if best is None or float(timeTaken) < best[0]:
+            best = (float(timeTaken), int(moduleCount))
+    return best
+
+def runBenchmark(output=sys.stdout):
+    results = []
+    statements = [(pattern, "import %s" % pattern) for pattern in PATTERNS]
+    statements.append(("package", "import designpatterns"))
+    statements.append(("package, one pattern", "import designpatterns; designpatterns.CommandPattern"))
+    statements.append(("every pattern", "; ".join("import %s" % pattern for pattern in PATTERNS)))
+    for name, statement in statements:
+        timeTaken, moduleCount = timeImport(statement)
+        result = {
+            "benchmark": name,
+            "timeMs": timeTaken,
+            "modules": moduleCount
+        }
+        output.write(json.dumps(result, sort_keys=True) + "\n")
+        results.append(result)
+    return results
+
+if __name__ == "__main__":
+    runBenchmark()